@@ -1,18 +1,51 @@
 from __future__ import annotations
 
-import json
-from json import JSONDecodeError
-from typing import Any, Dict, Optional
-
-from .identity import load_profile, build_system_prompt
-from .openai_client import chat_completion as default_chat_completion
+import asyncio
+import atexit
+import re
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Generator, Iterator, List, Optional, Tuple
+
+import orjson
+
+from .cache import LRUCache
+from .config import Config
+from .identity import load_system_prompt
+from .openai_client import (
+    BatchCompletionError,
+    acached_chat_completion,
+    batch_chat_completion,
+    cached_chat_completion,
+    cached_chat_completion_stream,
+    count_tokens,
+    embed,
+)
 from .memory import get_memory_manager
 from .email_agent import EmailAgent, EmailAgentError
+from .semantic_cache import SemanticCache
+from .intent_model import classify as classify_locally
 
-profile = load_profile()
-SYSTEM_PROMPT = build_system_prompt(profile)
+SYSTEM_PROMPT = load_system_prompt()
 _EMAIL_AGENT: Optional[EmailAgent] = None
 _EMAIL_AGENT_ERROR: Optional[Exception] = None
+_EMAIL_AGENT_LOCK = threading.Lock()
+_SEMANTIC_CACHE: Optional[SemanticCache] = None
+_SEMANTIC_CACHE_ERROR: Optional[Exception] = None
+# Read-only email commands that are safe to replay for a paraphrased request.
+# Anything with side effects (drafting, sending) must never be served from cache.
+_CACHEABLE_EMAIL_ACTIONS = {"summarize_inbox", "status"}
+# Memory writes happen after the reply is returned. A single worker keeps
+# turns stored in order; pending writes are flushed when the process exits.
+_MEMORY_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-writer")
+atexit.register(_MEMORY_EXECUTOR.shutdown, wait=True)
+# Whole replies to repeated messages, one cache per agent, keyed on the text and
+# the memory context it was answered with. Only read-only intents are stored;
+# a stored task or note clears that agent's cache, since its memory changed.
+_REPLY_CACHES: Dict[str, LRUCache] = {}
+_REPLY_CACHES_LOCK = threading.Lock()
+_UNCACHEABLE_INTENTS = {"task", "note", "email"}
 _EMAIL_KEYWORDS = {
     "email",
     "emails",
@@ -28,16 +61,20 @@ _EMAIL_KEYWORDS = {
 
 # ---------- Prompt blocks ----------
 
-_INTENT_PROMPT = """
-Classify the user's message into exactly ONE intent from this list:
-- task
-- note
-- draft_reply
-- question
-- other
-- email
+_EMAIL_COMMAND_GUIDANCE = """
+Email command guidance:
+- Use "summarize_inbox" to check the inbox or unread mail.
+- Use "summarize_thread" when they reference a sender/topic; include keywords in query.
+- Use "draft_reply" when they want a reply; include query to locate the thread and write instructions describing style/goals.
+- Use "send_draft" only if they explicitly approve sending the pending draft; set confirmation to "send_now" when approval is clear.
+- Use "status" if they ask about pending drafts or email tasks.
+- Default confirmation to "needs_confirmation" unless they explicitly request sending now.
+"""
+
+_RESPOND_PROMPT = """
+Classify the user's message and respond to it in a single pass.
 
-Rules:
+Intent rules:
 - "task": user wants something done (create, schedule, remember to do, follow up).
 - "note": user is providing information to store/remember (facts, context, decisions).
 - "draft_reply": user wants a draft response (email/message).
@@ -45,131 +82,423 @@ Rules:
 - "other": anything else.
 - "email": user wants inbox summaries, email context, or drafting/sending help.
 
-Return ONLY the intent string, nothing else.
-"""
+Fill task only for "task" and note only for "note"; otherwise leave them null.
+If intent is "draft_reply", put the drafted text in "reply".
+If intent is "question" or "other", answer naturally in "reply" (helpful, concise, in the user's voice).
+If intent is "email", leave "reply" empty and fill email_command.
+""" + _EMAIL_COMMAND_GUIDANCE
 
-_JSON_INSTRUCTIONS = """
-Return RAW JSON ONLY (no markdown, no triple backticks).
-Schema:
-{
-  "reply": string,
-  "intent": "task" | "note" | "draft_reply" | "question" | "other" | "email",
-  "task": object | null,
-  "note": object | null
+_EMAIL_ROUTING_PROMPT = """
+You convert user requests into email agent commands.
+""" + _EMAIL_COMMAND_GUIDANCE
+
+# ---------- Response schemas ----------
+
+_TASK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "description": {"type": "string"},
+        "due_date": {"type": ["string", "null"]},
+        "tags": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["title", "description", "due_date", "tags"],
+    "additionalProperties": False,
 }
 
-If intent is "task", include task with fields:
-- title (string)
-- description (string)
-- due_date (string|null)
-- tags (array of strings)
+_NOTE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "body": {"type": "string"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["title", "body", "tags"],
+    "additionalProperties": False,
+}
 
-If intent is "note", include note with fields:
-- title (string)
-- body (string)
-- tags (array of strings)
+_EMAIL_CMD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {
+            "type": "string",
+            "enum": ["summarize_inbox", "summarize_thread", "draft_reply", "send_draft", "status"],
+        },
+        "query": {"type": ["string", "null"]},
+        "instructions": {"type": ["string", "null"]},
+        "confirmation": {"type": ["string", "null"], "enum": ["send_now", "needs_confirmation", None]},
+    },
+    "required": ["action", "query", "instructions", "confirmation"],
+    "additionalProperties": False,
+}
 
-If intent is "draft_reply", put the drafted text in "reply" and leave task/note null.
-If intent is "question" or "other", keep task/note null.
-"""
+# "intent" comes first so streamed replies can be routed before "reply" arrives.
+_ACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "enum": ["task", "note", "draft_reply", "question", "other", "email"]},
+        "reply": {"type": "string"},
+        "task": {"anyOf": [_TASK_SCHEMA, {"type": "null"}]},
+        "note": {"anyOf": [_NOTE_SCHEMA, {"type": "null"}]},
+        "email_command": {"anyOf": [_EMAIL_CMD_SCHEMA, {"type": "null"}]},
+    },
+    "required": ["intent", "reply", "task", "note", "email_command"],
+    "additionalProperties": False,
+}
 
-_CONVERSATION_PROMPT = """
-You are conversing naturally with the user.
-Do NOT output JSON.
-Be helpful, concise, and aligned to the user's voice and guardrails.
-"""
 
-_EMAIL_ROUTING_PROMPT = """
-You convert user requests into email agent commands. Respond with RAW JSON only:
-{
-  "action": "summarize_inbox" | "summarize_thread" | "draft_reply" | "send_draft" | "status",
-  "query": string | null,
-  "instructions": string | null,
-  "confirmation": "send_now" | "needs_confirmation" | null
-}
+def _json_schema_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
 
-Guidance:
-- Use "summarize_inbox" to check the inbox or unread mail.
-- Use "summarize_thread" when they reference a sender/topic; include keywords in query.
-- Use "draft_reply" when they want a reply; include query to locate the thread and write instructions describing style/goals.
-- Use "send_draft" only if they explicitly approve sending the pending draft; set confirmation to "send_now" when approval is clear.
-- Use "status" if they ask about pending drafts or email tasks.
-- Default confirmation to "needs_confirmation" unless they explicitly request sending now.
-"""
+
+_ACTION_FORMAT = _json_schema_format("action", _ACTION_SCHEMA)
+_EMAIL_CMD_FORMAT = _json_schema_format("email_command", _EMAIL_CMD_SCHEMA)
+
+# Static leading messages, built once and copied into each request.
+# Tuples so a request can't accidentally mutate the shared prefix.
+_RESPOND_BASE = (
+    {"role": "system", "content": SYSTEM_PROMPT},
+    {"role": "system", "content": _RESPOND_PROMPT},
+)
+_EMAIL_ROUTING_BASE = (
+    {"role": "system", "content": _EMAIL_ROUTING_PROMPT},
+)
+
+_INTENTS = {"task", "note", "draft_reply", "question", "other", "email"}
+# Sampling temperature for user-facing replies (routing/JSON-only calls use 0.0)
+_REPLY_TEMPERATURE = 0.3
+# Below this softmax probability the local classifier defers to the LLM.
+_LOCAL_INTENT_MIN_PROB = 0.6
+
+# Any email keyword anywhere in the text (substring match, e.g. "emailed"), in one scan.
+_EMAIL_KEYWORD_RE = re.compile(
+    "|".join(map(re.escape, sorted(_EMAIL_KEYWORDS, key=len, reverse=True))), re.I
+)
+
+# Unambiguous phrasings that are routed locally instead of asking the model.
+_EMAIL_RE = re.compile(
+    r"\b(email|emails|inbox|mailbox|gmail|draft|drafts|reply|replies|unread)\b", re.I
+)
+_TASK_RE = re.compile(r"^\s*(remind me to\b|todo\s*:|to-do\s*:)", re.I)
+_NOTE_RE = re.compile(r"^\s*(remember that\b|note\s*:)", re.I)
+_QUESTION_RE = re.compile(r"\?\s*$|^\s*(who|what|when|where|why|how|which|is|are|can|could|do|does|should)\b", re.I)
+
+_FENCE_RE = re.compile(r"\A\s*```[a-zA-Z]*\s*\n?(.*?)\n?```\s*\Z", re.DOTALL)
+_INTENT_FIELD_RE = re.compile(r'"intent"\s*:\s*"(\w+)"')
+_REPLY_FIELD_RE = re.compile(r'"reply"\s*:\s*"')
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
 
 # ---------- Helpers ----------
 
 def _strip_code_fences(text: str) -> str:
-    t = text.strip()
-    if t.startswith("```"):
-        lines = t.splitlines()
-        if lines:
-            lines = lines[1:]
-        if lines and lines[-1].strip().startswith("```"):
-            lines = lines[:-1]
-        return "\n".join(lines).strip()
-    return t
-
-
-def _classify_intent(user_text: str, memory_context: Optional[str] = None, memory_manager=None) -> str:
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "system", "content": _INTENT_PROMPT},
-    ]
-    
-    # Add memory context if available
-    if memory_context:
-        messages.append({"role": "system", "content": f"Context:\n{memory_context}"})
+    match = _FENCE_RE.match(text)
+    return match.group(1).strip() if match else text.strip()
+
+
+def _complete(
+    messages,
+    memory_manager=None,
+    response_format=None,
+    model: Optional[str] = None,
+    static_prefix: int = 0,
+    temperature: float = _REPLY_TEMPERATURE,
+) -> str:
+    # Pass model only when overridden so each backend keeps its own default
+    kwargs = {"model": model} if model else {}
+    # Use Memori's chat completion if available, otherwise use default
+    if memory_manager and hasattr(memory_manager, "chat_completion"):
+        return memory_manager.chat_completion(messages, temperature=temperature, response_format=response_format, **kwargs)
+    # static_prefix lets the cache key reuse the hash of the leading prompt messages;
+    # only temperature 0.0 calls are served from the response cache
+    return cached_chat_completion(
+        messages, temperature=temperature, response_format=response_format, static_prefix=static_prefix, **kwargs
+    )
+
+
+def _complete_stream(
+    messages,
+    memory_manager=None,
+    response_format=None,
+    static_prefix: int = 0,
+    temperature: float = _REPLY_TEMPERATURE,
+) -> Iterator[str]:
+    if memory_manager and hasattr(memory_manager, "chat_completion_stream"):
+        return memory_manager.chat_completion_stream(messages, temperature=temperature, response_format=response_format)
+    return cached_chat_completion_stream(
+        messages, temperature=temperature, response_format=response_format, static_prefix=static_prefix
+    )
+
+
+def _loads_json(raw: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Parse a structured response, tolerating stray code fences from older models."""
+    candidate = (raw or "").lstrip()
+    if candidate.startswith("```"):
+        candidate = _strip_code_fences(candidate)
+    # Conversational prose can't be an object; skip the parser entirely
+    if candidate[:1] != "{":
+        return None
+    try:
+        data = orjson.loads(candidate)
+    except orjson.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _run_blocking(func, *args, executor: Optional[Executor] = None):
+    """Run a blocking call on an executor (the loop's default if None) so independent I/O can overlap."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args))
+
+
+def _encode_context_block(memory_context: Optional[str], max_tokens: Optional[int] = None) -> Optional[str]:
+    """
+    Build the memory context system message once per turn, capped at max_tokens.
     
-    messages.append({"role": "user", "content": user_text})
+    Whole lines are kept from the top (memories are ordered most relevant
+    first) so the header survives. SYSTEM_PROMPT is left untouched as the
+    stable prefix that the server-side prompt cache can reuse.
+    """
+    if not memory_context:
+        return None
+    if max_tokens is None:
+        max_tokens = Config.load().context_max_tokens
+    block = f"Context:\n{memory_context}"
+    if count_tokens(block) <= max_tokens:
+        return block
+
+    kept = []
+    used = 0
+    for line in block.splitlines():
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept) if len(kept) > 1 else None
+
+
+def _load_memory(user_text: str, agent_id: str) -> Tuple[Any, Optional[str]]:
+    """Get the memory manager for this agent namespace and the context block for the message."""
+    try:
+        memory_manager = get_memory_manager(agent_id)
+        return memory_manager, _encode_context_block(memory_manager.build_memory_context(user_text))
+    except Exception as e:
+        # If memory fails, continue without it
+        print(f"Warning: Memory not available: {e}")
+        return None, None
 
-    # Use Memori's chat completion if available, otherwise use default
-    if memory_manager and hasattr(memory_manager, 'chat_completion'):
-        raw = memory_manager.chat_completion(messages).strip().lower()
-    else:
-        raw = default_chat_completion(messages).strip().lower()
-    raw = raw.split()[0] if raw else "other"
 
-    allowed = {"task", "note", "draft_reply", "question", "other", "email"}
-    return raw if raw in allowed else "other"
+def _persist_memory(memory_manager, user_text: str, result: Dict[str, Any]) -> None:
+    """Store the conversation and any note/task produced by the turn."""
+    try:
+        # Always store the conversation
+        memory_manager.add_conversation(user_text, result.get("reply", ""))
+        
+        # Store notes and tasks explicitly
+        if result.get("note"):
+            note = result["note"]
+            note_content = f"{note.get('title', 'Note')}: {note.get('body', '')}"
+            memory_manager.store_memory(
+                content=note_content,
+                memory_type="note",
+                metadata={"tags": note.get("tags", [])}
+            )
+        
+        if result.get("task"):
+            task = result["task"]
+            task_content = f"Task: {task.get('title', '')} - {task.get('description', '')}"
+            memory_manager.store_memory(
+                content=task_content,
+                memory_type="task",
+                metadata={
+                    "due_date": task.get("due_date"),
+                    "tags": task.get("tags", [])
+                }
+            )
+        
+        # Memori automatically captures conversations, so no need for manual storage
+        # The preference detection is handled automatically by Memori
+    except Exception as e:
+        print(f"Warning: Failed to store in memory: {e}")
+
+
+def _pre_classify(user_text: str) -> Optional[str]:
+    """Return the intent for obvious messages, or None when the model should decide."""
+    if _EMAIL_RE.search(user_text):
+        return "email"
+    if _TASK_RE.search(user_text):
+        return "task"
+    if _NOTE_RE.search(user_text):
+        return "note"
+
+    # Then the local classifier, when a model is installed and confident
+    prediction = classify_locally(user_text)
+    if prediction and prediction[1] >= _LOCAL_INTENT_MIN_PROB:
+        return prediction[0]
+    return None
+
+
+def _fallback_intent(user_text: str) -> str:
+    """Cheap local classifier used when the model's JSON can't be parsed."""
+    if _EMAIL_KEYWORD_RE.search(user_text):
+        return "email"
+    if _QUESTION_RE.search(user_text):
+        return "question"
+    return "other"
+
+
+class _ReplyStreamExtractor:
+    """Incrementally decode the "reply" string out of a JSON response as it streams in.
+
+    Text is only released once the "intent" field shows the reply is meant
+    for the user (email intents are answered by the email agent instead).
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.intent: Optional[str] = None
+        self._pos: Optional[int] = None
+        self._done = False
+
+    def feed(self, chunk: str) -> str:
+        self.raw += chunk
+        if self.intent is None:
+            match = _INTENT_FIELD_RE.search(self.raw)
+            if not match:
+                return ""
+            self.intent = match.group(1)
+        if self.intent == "email" or self._done:
+            return ""
+        if self._pos is None:
+            match = _REPLY_FIELD_RE.search(self.raw)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        out = []
+        pos = self._pos
+        while pos < len(self.raw):
+            char = self.raw[pos]
+            if char == '"':
+                self._done = True
+                break
+            if char != "\\":
+                out.append(char)
+                pos += 1
+                continue
+            if pos + 1 >= len(self.raw):
+                break
+            escape = self.raw[pos + 1]
+            if escape == "u":
+                if pos + 6 > len(self.raw):
+                    break
+                code = int(self.raw[pos + 2:pos + 6], 16)
+                if 0xD800 <= code <= 0xDBFF:
+                    # High surrogate: wait for the low half so the pair decodes to one character
+                    follow = self.raw[pos + 6:pos + 12]
+                    if len(follow) < 6 and "\\u".startswith(follow[:2]):
+                        break
+                    if follow[:2] == "\\u":
+                        low = int(self.raw[pos + 8:pos + 12], 16)
+                        if 0xDC00 <= low <= 0xDFFF:
+                            out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                            pos += 12
+                            continue
+                    code = 0xFFFD
+                elif 0xDC00 <= code <= 0xDFFF:
+                    code = 0xFFFD
+                out.append(chr(code))
+                pos += 6
+            else:
+                out.append(_JSON_ESCAPES.get(escape, escape))
+                pos += 2
+        self._pos = pos
+        return "".join(out)
 
 
 def _get_email_agent() -> EmailAgent:
     global _EMAIL_AGENT, _EMAIL_AGENT_ERROR
-    if _EMAIL_AGENT is None and _EMAIL_AGENT_ERROR is None:
+    with _EMAIL_AGENT_LOCK:
+        if _EMAIL_AGENT is None and _EMAIL_AGENT_ERROR is None:
+            try:
+                _EMAIL_AGENT = EmailAgent()
+            except Exception as exc:
+                _EMAIL_AGENT_ERROR = exc
+        if _EMAIL_AGENT is None:
+            raise EmailAgentError(f"Email agent unavailable: {_EMAIL_AGENT_ERROR}")
+        return _EMAIL_AGENT
+
+
+def _warm_email_agent() -> None:
+    """Create the email agent and its Gmail client ahead of the first email request."""
+    try:
+        _get_email_agent().warm_up()
+    except Exception:
+        # Errors surface on the first real email request instead
+        pass
+
+
+def _get_semantic_cache() -> Optional[SemanticCache]:
+    """Return the routing cache when enabled via SEMANTIC_CACHE=1."""
+    global _SEMANTIC_CACHE, _SEMANTIC_CACHE_ERROR
+    config = Config.load()
+    if not config.semantic_cache:
+        return None
+    if _SEMANTIC_CACHE is None and _SEMANTIC_CACHE_ERROR is None:
         try:
-            _EMAIL_AGENT = EmailAgent()
+            _SEMANTIC_CACHE = SemanticCache(threshold=config.semantic_cache_threshold)
         except Exception as exc:
-            _EMAIL_AGENT_ERROR = exc
-    if _EMAIL_AGENT is None:
-        raise EmailAgentError(f"Email agent unavailable: {_EMAIL_AGENT_ERROR}")
-    return _EMAIL_AGENT
+            _SEMANTIC_CACHE_ERROR = exc
+            print(f"Warning: Semantic cache not available: {exc}")
+    return _SEMANTIC_CACHE
 
 
-def _parse_email_command(user_text: str, memory_context: Optional[str] = None, memory_manager=None) -> Dict[str, Any]:
-    messages = [{"role": "system", "content": _EMAIL_ROUTING_PROMPT}]
-    if memory_context:
-        messages.append({"role": "system", "content": f"Context:\n{memory_context}"})
-    messages.append({"role": "user", "content": user_text})
+def _lookup_cached_route(user_text: str) -> Tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+    """Embed the message and look up a cached email command for it."""
+    cache = _get_semantic_cache()
+    if cache is None:
+        return None, None
+    try:
+        embedding = embed(user_text)
+        return embedding, cache.lookup(embedding)
+    except Exception as e:
+        print(f"Warning: Semantic cache lookup failed: {e}")
+        return None, None
 
-    if memory_manager and hasattr(memory_manager, "chat_completion"):
-        raw = memory_manager.chat_completion(messages)
-    else:
-        raw = default_chat_completion(messages)
-    raw = _strip_code_fences(raw)
+
+def _remember_route(embedding: Optional[List[float]], command: Any) -> None:
+    cache = _get_semantic_cache()
+    if cache is None or embedding is None or not isinstance(command, dict):
+        return
+    if command.get("action") not in _CACHEABLE_EMAIL_ACTIONS:
+        return
     try:
-        return json.loads(raw)
-    except JSONDecodeError:
+        cache.add(embedding, command)
+    except Exception as e:
+        print(f"Warning: Failed to update semantic cache: {e}")
+
+
+def _parse_email_command(user_text: str, context_block: Optional[str] = None, memory_manager=None) -> Dict[str, Any]:
+    messages = list(_EMAIL_ROUTING_BASE)
+    if context_block:
+        messages.append({"role": "system", "content": context_block})
+    messages.append({"role": "user", "content": user_text})
+
+    raw = _complete(
+        messages, memory_manager, _EMAIL_CMD_FORMAT, Config.load().routing_model, len(_EMAIL_ROUTING_BASE), temperature=0.0
+    )
+    command = _loads_json(raw)
+    if command is None:
         return {"action": "summarize_inbox", "query": None, "instructions": None, "confirmation": None}
+    return command
 
 
-def _handle_email(user_text: str, memory_context: Optional[str] = None, memory_manager=None) -> Dict[str, Any]:
+def _handle_email(command: Dict[str, Any]) -> Dict[str, Any]:
     try:
         agent = _get_email_agent()
     except EmailAgentError as exc:
         return {"reply": str(exc), "intent": "email", "task": None, "note": None}
 
-    command = _parse_email_command(user_text, memory_context, memory_manager)
     action = command.get("action", "summarize_inbox")
     query = (command.get("query") or "").strip()
     instructions = (command.get("instructions") or "").strip()
@@ -207,131 +536,345 @@ def _handle_email(user_text: str, memory_context: Optional[str] = None, memory_m
     return {"reply": reply_text, "intent": "email", "task": None, "note": None}
 
 
-def _handle_action(user_text: str, intent: str, memory_context: Optional[str] = None, memory_manager=None) -> Dict[str, Any]:
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "system", "content": _JSON_INSTRUCTIONS},
-    ]
+def _build_respond_messages(
+    user_text: str,
+    context_block: Optional[str] = None,
+    intent_hint: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    messages = list(_RESPOND_BASE)
     
     # Add memory context if available
-    if memory_context:
-        messages.append({"role": "system", "content": f"Context:\n{memory_context}"})
+    if context_block:
+        messages.append({"role": "system", "content": context_block})
     
-    messages.append({"role": "user", "content": f"INTENT_HINT: {intent}\n\nUSER_MESSAGE: {user_text}"})
-
-    # Use Memori's chat completion if available, otherwise use default
-    if memory_manager and hasattr(memory_manager, 'chat_completion'):
-        raw = memory_manager.chat_completion(messages)
+    if intent_hint:
+        messages.append({"role": "user", "content": f"INTENT_HINT: {intent_hint}\n\nUSER_MESSAGE: {user_text}"})
     else:
-        raw = default_chat_completion(messages)
-    raw = _strip_code_fences(raw)
+        messages.append({"role": "user", "content": user_text})
+    return messages
 
-    try:
-        data = json.loads(raw)
-    except JSONDecodeError:
-        return {"reply": raw, "intent": "other", "task": None, "note": None}
 
+def _parse_response(raw: str, user_text: str, intent_hint: Optional[str] = None) -> Dict[str, Any]:
+    data = _loads_json(raw)
+    if data is None:
+        intent = intent_hint or _fallback_intent(user_text)
+        return {"reply": _strip_code_fences(raw or ""), "intent": intent, "task": None, "note": None}
+
+    intent = data.get("intent")
     return {
         "reply": data.get("reply", ""),
-        "intent": data.get("intent", intent),
+        "intent": intent if intent in _INTENTS else "other",
         "task": data.get("task"),
         "note": data.get("note"),
+        "email_command": data.get("email_command"),
     }
 
 
-def _handle_conversation(user_text: str, intent: str, memory_context: Optional[str] = None, memory_manager=None) -> Dict[str, Any]:
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "system", "content": _CONVERSATION_PROMPT},
-    ]
+def _respond(
+    user_text: str,
+    context_block: Optional[str] = None,
+    memory_manager=None,
+    intent_hint: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Classify the message and build the action payload with one LLM call."""
+    messages = _build_respond_messages(user_text, context_block, intent_hint)
+    return _parse_response(_complete(messages, memory_manager, _ACTION_FORMAT, static_prefix=len(_RESPOND_BASE)), user_text, intent_hint)
+
+
+async def _arespond(
+    user_text: str,
+    context_block: Optional[str] = None,
+    memory_manager=None,
+    intent_hint: Optional[str] = None,
+    executor: Optional[Executor] = None,
+) -> Dict[str, Any]:
+    """Async variant of _respond: awaits the API directly instead of blocking a thread."""
+    if memory_manager and hasattr(memory_manager, "chat_completion"):
+        # Memori records turns through its own registered (sync) client
+        return await _run_blocking(
+            _respond, user_text, context_block, memory_manager, intent_hint, executor=executor
+        )
+    messages = _build_respond_messages(user_text, context_block, intent_hint)
+    raw = await acached_chat_completion(
+        messages, temperature=_REPLY_TEMPERATURE, response_format=_ACTION_FORMAT, static_prefix=len(_RESPOND_BASE)
+    )
+    return _parse_response(raw, user_text, intent_hint)
+
+
+def _respond_stream(
+    user_text: str,
+    context_block: Optional[str] = None,
+    memory_manager=None,
+    intent_hint: Optional[str] = None,
+) -> Generator[str, None, Dict[str, Any]]:
+    """Streaming variant of _respond: yields reply text, returns the parsed result."""
+    messages = _build_respond_messages(user_text, context_block, intent_hint)
+    extractor = _ReplyStreamExtractor()
+    for chunk in _complete_stream(messages, memory_manager, _ACTION_FORMAT, len(_RESPOND_BASE)):
+        text = extractor.feed(chunk or "")
+        if text:
+            yield text
+    return _parse_response(extractor.raw, user_text, intent_hint)
+
+
+async def _prepare(user_text: str, agent_id: str, executor: Optional[Executor] = None):
+    """Load memory and look up a cached route; the two don't depend on each other."""
+    (memory_manager, context_block), (embedding, email_command) = await asyncio.gather(
+        _run_blocking(_load_memory, user_text, agent_id, executor=executor),
+        # Paraphrases of a read-only email request can reuse the cached command
+        _run_blocking(_lookup_cached_route, user_text, executor=executor),
+    )
+    return memory_manager, context_block, embedding, email_command
+
+
+def _finish(
+    user_text: str,
+    result: Dict[str, Any],
+    email_command: Optional[Dict[str, Any]],
+    embedding: Optional[List[float]],
+    context_block: Optional[str],
+    memory_manager,
+) -> Dict[str, Any]:
+    """Run the email agent if needed and queue the turn for storage in memory."""
+    if "email_command" in result:
+        email_command = result.pop("email_command")
+        if result["intent"] != "email":
+            if _EMAIL_KEYWORD_RE.search(user_text):
+                result["intent"] = "email"
+                email_command = None
+        elif email_command:
+            _remember_route(embedding, email_command)
     
-    # Add memory context if available
-    if memory_context:
-        messages.append({"role": "system", "content": f"Context:\n{memory_context}"})
+    # Email intents are executed by the email agent
+    if result["intent"] == "email":
+        if not isinstance(email_command, dict) or not email_command.get("action"):
+            email_command = _parse_email_command(user_text, context_block, memory_manager)
+            _remember_route(embedding, email_command)
+        result = _handle_email(email_command)
     
-    messages.append({"role": "user", "content": user_text})
+    # Store conversation and important information in memory off the response path
+    if memory_manager:
+        _MEMORY_EXECUTOR.submit(_persist_memory, memory_manager, user_text, result)
+    
+    return result
+
+
+def _reply_cache(agent_id: str) -> LRUCache:
+    with _REPLY_CACHES_LOCK:
+        cache = _REPLY_CACHES.get(agent_id)
+        if cache is None:
+            cache = _REPLY_CACHES[agent_id] = LRUCache(maxsize=256)
+    # Follow the current setting, so reload_env() applies to existing caches too
+    cache.ttl = Config.load().reply_cache_ttl
+    return cache
 
-    # Use Memori's chat completion if available, otherwise use default
-    if memory_manager and hasattr(memory_manager, 'chat_completion'):
-        reply = memory_manager.chat_completion(messages).strip()
-    else:
-        reply = default_chat_completion(messages).strip()
-    return {"reply": reply, "intent": intent, "task": None, "note": None}
+
+def _reply_key(user_text: str, context_block: Optional[str]) -> Tuple[str, Optional[str]]:
+    return user_text.strip().lower(), context_block
+
+
+def _lookup_reply(user_text: str, agent_id: str, context_block: Optional[str]) -> Optional[Dict[str, Any]]:
+    result = _reply_cache(agent_id).get(_reply_key(user_text, context_block))
+    # Callers may mutate the result; hand out a copy
+    return dict(result) if result is not None else None
+
+
+def _remember_reply(user_text: str, agent_id: str, context_block: Optional[str], result: Dict[str, Any]) -> None:
+    if result.get("intent") in _UNCACHEABLE_INTENTS:
+        if result.get("intent") != "email":
+            _reply_cache(agent_id).clear()
+        return
+    if result.get("reply"):
+        _reply_cache(agent_id).set(_reply_key(user_text, context_block), dict(result))
+
+
+def _email_placeholder() -> Dict[str, Any]:
+    return {"reply": "", "intent": "email", "task": None, "note": None}
 
 
 # ---------- Public API ----------
 
-def handle_message(user_text: str, agent_id: str = "main_assistant") -> Dict[str, Any]:
+async def handle_message_async(
+    user_text: str,
+    agent_id: str = "main_assistant",
+    executor: Optional[Executor] = None,
+) -> Dict[str, Any]:
     """
     Handle a user message with memory integration.
     
+    Memory retrieval and the routing-cache lookup don't depend on each other,
+    so they run concurrently; total wait is the slower of the two.
+    
     Args:
         user_text: The user's message
         agent_id: Unique identifier for the agent/namespace (for memory isolation).
                   Use different IDs for different agents (e.g., "main_assistant", "email_agent")
+        executor: Where blocking work (memory, email, Memori calls) runs;
+                  defaults to the event loop's default executor
         
     Returns:
         Dictionary with reply, intent, task, and note
     """
-    # Get memory manager for this agent namespace
-    memory_manager = None
-    memory_context = None
+    memory_manager, context_block, embedding, email_command = await _prepare(user_text, agent_id, executor)
     
-    try:
-        memory_manager = get_memory_manager(agent_id)
-        memory_context = memory_manager.build_memory_context(user_text)
-    except Exception as e:
-        # If memory fails, continue without it
-        print(f"Warning: Memory not available: {e}")
-        memory_context = None
-        memory_manager = None
+    # Obvious phrasings skip model-side classification
+    intent_hint = _pre_classify(user_text)
+
+    cached = None
+    if email_command or intent_hint == "email":
+        result = _email_placeholder()
+    else:
+        # Classify and respond in a single call, unless this exact turn was just answered
+        cached = _lookup_reply(user_text, agent_id, context_block)
+        result = cached or await _arespond(user_text, context_block, memory_manager, intent_hint, executor)
     
-    # Classify intent with memory context
-    intent = _classify_intent(user_text, memory_context, memory_manager)
-    if intent != "email":
-        normalized = user_text.lower()
-        if any(keyword in normalized for keyword in _EMAIL_KEYWORDS):
-            intent = "email"
+    # Cache hits are still recorded as turns in memory
+    result = await _run_blocking(
+        _finish, user_text, result, email_command, embedding, context_block, memory_manager,
+        executor=executor,
+    )
+    if cached is None:
+        _remember_reply(user_text, agent_id, context_block, result)
+    return result
+
+
+def handle_message(user_text: str, agent_id: str = "main_assistant") -> Dict[str, Any]:
+    """
+    Synchronous counterpart of handle_message_async for callers without an event loop.
     
-    # Handle based on intent
-    if intent == "email":
-        result = _handle_email(user_text, memory_context, memory_manager)
-    elif intent in {"task", "note", "draft_reply"}:
-        result = _handle_action(user_text, intent, memory_context, memory_manager)
-    else:
-        result = _handle_conversation(user_text, intent, memory_context, memory_manager)
+    The model call goes through the shared sync client. Async clients are tied
+    to their event loop, so each asyncio.run() here would otherwise open (and
+    keep) a fresh client and connection pool.
+    """
+    memory_manager, context_block, embedding, email_command = asyncio.run(_prepare(user_text, agent_id))
     
-    # Store conversation and important information in memory
-    if memory_manager:
-        try:
-            # Always store the conversation
-            memory_manager.add_conversation(user_text, result.get("reply", ""))
-            
-            # Store notes and tasks explicitly
-            if result.get("note"):
-                note = result["note"]
-                note_content = f"{note.get('title', 'Note')}: {note.get('body', '')}"
-                memory_manager.store_memory(
-                    content=note_content,
-                    memory_type="note",
-                    metadata={"tags": note.get("tags", [])}
-                )
-            
-            if result.get("task"):
-                task = result["task"]
-                task_content = f"Task: {task.get('title', '')} - {task.get('description', '')}"
-                memory_manager.store_memory(
-                    content=task_content,
-                    memory_type="task",
-                    metadata={
-                        "due_date": task.get("due_date"),
-                        "tags": task.get("tags", [])
-                    }
-                )
-            
-            # Memori automatically captures conversations, so no need for manual storage
-            # The preference detection is handled automatically by Memori
-        except Exception as e:
-            print(f"Warning: Failed to store in memory: {e}")
+    # Obvious phrasings skip model-side classification
+    intent_hint = _pre_classify(user_text)
+
+    cached = None
+    if email_command or intent_hint == "email":
+        result = _email_placeholder()
+    else:
+        # Classify and respond in a single call, unless this exact turn was just answered
+        cached = _lookup_reply(user_text, agent_id, context_block)
+        result = cached or _respond(user_text, context_block, memory_manager, intent_hint)
     
+    # Cache hits are still recorded as turns in memory
+    result = _finish(user_text, result, email_command, embedding, context_block, memory_manager)
+    if cached is None:
+        _remember_reply(user_text, agent_id, context_block, result)
     return result
+
+
+def handle_message_stream(user_text: str, agent_id: str = "main_assistant") -> Iterator[str]:
+    """
+    Handle a user message like handle_message, yielding the reply as it is generated.
+    
+    Conversational and action replies are streamed token by token; email
+    replies come from the email agent and are yielded once complete. Memory
+    is updated after the full reply has been produced.
+    """
+    memory_manager, context_block, embedding, email_command = asyncio.run(_prepare(user_text, agent_id))
+    
+    # Obvious phrasings skip model-side classification
+    intent_hint = _pre_classify(user_text)
+
+    streamed = ""
+    is_email = bool(email_command) or intent_hint == "email"
+    cached = None if is_email else _lookup_reply(user_text, agent_id, context_block)
+    if is_email:
+        result = _email_placeholder()
+    elif cached is not None:
+        # Emitted in one piece below, like email replies
+        result = cached
+    else:
+        stream = _respond_stream(user_text, context_block, memory_manager, intent_hint)
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration as stop:
+                result = stop.value
+                break
+            streamed += chunk
+            yield chunk
+    
+    # Cache hits are still recorded as turns in memory
+    result = _finish(user_text, result, email_command, embedding, context_block, memory_manager)
+    if cached is None:
+        _remember_reply(user_text, agent_id, context_block, result)
+    
+    # Emit whatever wasn't streamed (email replies, unparseable responses)
+    reply = result.get("reply", "")
+    if reply.startswith(streamed):
+        remainder = reply[len(streamed):]
+    else:
+        remainder = f"\n\n{reply}"
+    if remainder:
+        yield remainder
+
+
+
+def handle_messages_batch(texts: List[str], agent_id: str = "main_assistant") -> List[Dict[str, Any]]:
+    """
+    Handle many independent messages through a single OpenAI Batch API job.
+    
+    Meant for offline use (replaying logs, evaluation sweeps): batch jobs are
+    cheaper per request but can take minutes to complete, so interactive
+    callers should keep using handle_message.
+    
+    Returns:
+        One result dictionary per input, in input order. A turn whose batch
+        request failed gets an "error" entry and is not stored in memory.
+    """
+    prepared = [asyncio.run(_prepare(text, agent_id)) for text in texts]
+    hints = [_pre_classify(text) for text in texts]
+
+    # Only turns that need the respond prompt go into the batch
+    pending = [
+        i for i, (_, _, _, email_command) in enumerate(prepared)
+        if not (email_command or hints[i] == "email")
+    ]
+    failures: Dict[int, str] = {}
+    try:
+        # Same sampling as the interactive reply path
+        raws = batch_chat_completion(
+            [_build_respond_messages(texts[i], prepared[i][1], hints[i]) for i in pending],
+            temperature=_REPLY_TEMPERATURE,
+            response_format=_ACTION_FORMAT,
+        ) if pending else []
+    except BatchCompletionError as exc:
+        raws = exc.results
+        failures = {pending[j]: message for j, message in exc.errors.items()}
+    responses = dict(zip(pending, raws))
+
+    results = []
+    for i, text in enumerate(texts):
+        memory_manager, context_block, embedding, email_command = prepared[i]
+        if i in failures:
+            results.append({
+                "reply": "", "intent": "other", "task": None, "note": None, "error": failures[i],
+            })
+            continue
+        if i in responses:
+            result = _parse_response(responses[i], text, hints[i])
+        else:
+            result = _email_placeholder()
+        results.append(_finish(text, result, email_command, embedding, context_block, memory_manager))
+    return results
+
+
+_WARMUP_STARTED = False
+
+
+def start_warmup() -> None:
+    """
+    Warm the email agent in the background so the first email turn doesn't pay for setup.
+    
+    Called by the interactive entry points; importing this module starts nothing.
+    """
+    global _WARMUP_STARTED
+    with _EMAIL_AGENT_LOCK:
+        if _WARMUP_STARTED:
+            return
+        _WARMUP_STARTED = True
+    threading.Thread(target=_warm_email_agent, name="email-agent-warmup", daemon=True).start()
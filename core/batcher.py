@@ -0,0 +1,71 @@
+"""Coalesce messages that arrive back-to-back in one conversation into a single assistant turn."""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+
+class MessageBatcher:
+    """
+    Per-key micro-batcher for incoming messages.
+
+    Messages submitted under the same key within ``window`` seconds of the first
+    one are joined (in arrival order) and handled by one ``handler`` call. The
+    last message of a batch receives the handler's result (or its exception);
+    the earlier ones resolve to ``None`` because that reply answers them too.
+    Different keys never share a call, so one user's text is never mixed into
+    another's prompt.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Hashable, str], Awaitable[Any]],
+        window: float = 0.05,
+        max_items: int = 8,
+    ):
+        self.handler = handler
+        self.window = window
+        self.max_items = max_items
+        self._queues: Dict[Hashable, "asyncio.Queue[Tuple[str, asyncio.Future]]"] = {}
+        # The event loop only keeps weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, key: Hashable, text: str) -> Optional[Any]:
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue()
+            task = asyncio.create_task(self._drain(key, queue))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        queue.put_nowait((text, future))
+        return await future
+
+    async def _drain(self, key: Hashable, queue: "asyncio.Queue[Tuple[str, asyncio.Future]]") -> None:
+        loop = asyncio.get_running_loop()
+        while not queue.empty():
+            batch: List[Tuple[str, asyncio.Future]] = [queue.get_nowait()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_items:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            *folded, last = [future for _, future in batch]
+            for future in folded:
+                if not future.done():
+                    future.set_result(None)
+            try:
+                result = await self.handler(key, "\n".join(text for text, _ in batch))
+            except Exception as e:
+                if not last.done():
+                    last.set_exception(e)
+            else:
+                if not last.done():
+                    last.set_result(result)
+        # Nothing was awaited since the empty check, so no submit can slip in between
+        del self._queues[key]
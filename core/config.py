@@ -0,0 +1,112 @@
+"""Process-wide settings, read from the environment (and .env) once."""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import FrozenSet, Optional
+
+from dotenv import load_dotenv
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ENV_PATH = PROJECT_ROOT / ".env"
+
+
+@lru_cache(maxsize=1)
+def load_env() -> bool:
+    # Load project .env if present; do not fail if missing.
+    # Runs once per process, including when there is no .env; see reload_env().
+    if ENV_PATH.exists():
+        load_dotenv(dotenv_path=ENV_PATH, override=True)
+    else:
+        load_dotenv(override=True)
+    return True
+
+
+def reload_env() -> bool:
+    """Parse .env again, e.g. after editing it in a long-running process.
+
+    Also drops the cached Config, so the next Config.load() sees the new values.
+    """
+    load_env.cache_clear()
+    Config.load.cache_clear()
+    return load_env()
+
+
+@dataclass(frozen=True)
+class Config:
+    agent_id: str
+    model: str
+    bot_token: Optional[str]
+    openai_pool: int
+    # Seconds a Telegram message may spend in the assistant before it's abandoned
+    openai_timeout: float
+    # Per-user message coalescing window (milliseconds) and batch size
+    batch_ms: float
+    batch_max: int
+    # Small, fast model for routing hops that only pick a command
+    routing_model: str
+    # Token budget for the per-turn memory context message
+    context_max_tokens: int
+    # Lifetime (seconds) of memoized replies to repeated messages
+    reply_cache_ttl: float
+    # Embedding-based routing cache for email commands (off unless SEMANTIC_CACHE=1)
+    semantic_cache: bool
+    semantic_cache_threshold: float
+    # Recent memory facts: how long a fetch is reused (seconds) and how many are ranked
+    memory_facts_ttl: float
+    memory_facts_limit: int
+    # Local ONNX intent classifier; None means the bundled models/ paths
+    intent_model_path: Optional[str]
+    intent_tokenizer_path: Optional[str]
+    # Gmail / email agent
+    email_summary_limit: int
+    gmail_token_path: Optional[str]
+    gmail_credentials_path: Optional[str]
+    email_sender_address: Optional[str]
+    email_prompt_cache_ttl: float
+    email_max_body_chars: int
+    # Telegram user IDs allowed to talk to the bot; empty means everyone
+    allowed_user_ids: FrozenSet[int]
+    # Public HTTPS base URL for Telegram webhooks; unset means long polling (dev)
+    webhook_url: Optional[str]
+    webhook_port: int
+    webhook_secret: Optional[str]
+
+    @classmethod
+    @lru_cache(maxsize=1)
+    def load(cls) -> "Config":
+        """Build the settings on first use; later calls return the same instance."""
+        load_env()
+        return cls(
+            agent_id=os.getenv("AGENT_ID", "main_assistant"),
+            model=os.getenv("OPENAI_MODEL", "gpt-4.1-mini"),
+            bot_token=os.getenv("TELEGRAM_BOT_TOKEN"),
+            openai_pool=int(os.getenv("OPENAI_POOL", "8")),
+            openai_timeout=float(os.getenv("OPENAI_TIMEOUT", "30")),
+            batch_ms=float(os.getenv("BATCH_MS", "50")),
+            batch_max=int(os.getenv("BATCH_MAX", "8")),
+            routing_model=os.getenv("OPENAI_ROUTING_MODEL", "gpt-4o-mini"),
+            context_max_tokens=int(os.getenv("MEMORY_CONTEXT_MAX_TOKENS", "400")),
+            reply_cache_ttl=float(os.getenv("REPLY_CACHE_TTL", "300")),
+            semantic_cache=os.getenv("SEMANTIC_CACHE", "").lower() in {"1", "true", "yes"},
+            semantic_cache_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            memory_facts_ttl=float(os.getenv("MEMORY_FACTS_TTL", "10")),
+            memory_facts_limit=int(os.getenv("MEMORY_FACTS_LIMIT", "25")),
+            intent_model_path=os.getenv("INTENT_MODEL_PATH") or None,
+            intent_tokenizer_path=os.getenv("INTENT_TOKENIZER_PATH") or None,
+            email_summary_limit=int(os.getenv("EMAIL_SUMMARY_LIMIT", "10")),
+            gmail_token_path=os.getenv("GMAIL_TOKEN_PATH") or None,
+            gmail_credentials_path=os.getenv("GMAIL_CREDENTIALS_PATH") or None,
+            email_sender_address=os.getenv("EMAIL_SENDER_ADDRESS") or None,
+            email_prompt_cache_ttl=float(os.getenv("EMAIL_PROMPT_CACHE_TTL", "60")),
+            email_max_body_chars=int(os.getenv("EMAIL_MAX_BODY_CHARS", "2000")),
+            allowed_user_ids=frozenset(
+                int(user_id) for user_id in os.getenv("TELEGRAM_ALLOWED_USER_IDS", "").split(",")
+                if user_id.strip()
+            ),
+            webhook_url=os.getenv("TELEGRAM_WEBHOOK_URL") or None,
+            webhook_port=int(os.getenv("PORT", "8443")),
+            webhook_secret=os.getenv("TELEGRAM_WEBHOOK_SECRET") or None,
+        )
@@ -7,7 +7,9 @@ work.
 from __future__ import annotations
 
 import base64
-import os
+import binascii
+import hashlib
+import threading
 from dataclasses import dataclass
 from email.message import EmailMessage
 from pathlib import Path
@@ -20,6 +22,8 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from .cache import LRUCache
+from .config import Config
 from .openai_client import chat_completion
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -33,6 +37,32 @@ SCOPES = [
     "https://www.googleapis.com/auth/gmail.send",
 ]
 
+# Recent LLM outputs keyed by prompt hash, so repeated requests skip the model.
+_PROMPT_CACHE = LRUCache(maxsize=256, ttl=60.0)
+
+
+def _prompt_cache() -> LRUCache:
+    # Follow the current setting, so config.reload_env() applies here too
+    _PROMPT_CACHE.ttl = Config.load().email_prompt_cache_ttl
+    return _PROMPT_CACHE
+
+
+def _prompt_key(system_prompt: str, user_content: str) -> str:
+    return hashlib.blake2b(
+        f"{system_prompt}\x1f{user_content}".encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+# Maps Gmail's URL-safe base64 alphabet onto the standard one for binascii.
+_URLSAFE_TAB = bytes.maketrans(b"-_", b"+/")
+
+# Partial-response mask covering what thread formatting and replies read.
+_THREAD_FIELDS = "messages(id,snippet,payload(mimeType,headers,body/data,parts(mimeType,body/data)))"
+
+# Built Gmail services keyed by token path, shared across EmailAgent instances.
+_SERVICE_CACHE: Dict[str, Any] = {}
+_SERVICE_LOCK = threading.Lock()
+
 
 class EmailAgentError(RuntimeError):
     """Raised when an email action cannot be completed."""
@@ -63,11 +93,12 @@ class EmailAgent:
         credentials_path: Optional[Path] = None,
         prompts: Optional[EmailPromptConfig] = None,
     ):
-        self.token_path = Path(os.getenv("GMAIL_TOKEN_PATH", token_path or DEFAULT_TOKEN_PATH))
+        config = Config.load()
+        self.token_path = Path(config.gmail_token_path or token_path or DEFAULT_TOKEN_PATH)
         self.credentials_path = Path(
-            os.getenv("GMAIL_CREDENTIALS_PATH", credentials_path or DEFAULT_CREDENTIALS_PATH)
+            config.gmail_credentials_path or credentials_path or DEFAULT_CREDENTIALS_PATH
         )
-        self.sender_address = os.getenv("EMAIL_SENDER_ADDRESS")
+        self.sender_address = config.email_sender_address
         self.prompts = prompts or EmailPromptConfig()
         self._service = None
         self.pending_draft: Optional[Dict[str, Any]] = None
@@ -75,7 +106,7 @@ class EmailAgent:
     # ---------- Public API ----------
 
     def summarize_inbox(self, limit: Optional[int] = None) -> str:
-        limit = limit or int(os.getenv("EMAIL_SUMMARY_LIMIT", "10"))
+        limit = limit or Config.load().email_summary_limit
         try:
             service = self._get_service()
             response = service.users().messages().list(
@@ -85,9 +116,16 @@ class EmailAgent:
             if not refs:
                 return "Your inbox is clear right now."
 
-            messages = [self._fetch_message(ref["id"]) for ref in refs]
-            content = self._format_messages_for_summary(messages)
-            return self._run_prompt(self.prompts.inbox_summary, content)
+            # The same message IDs mean the same summary; new mail changes the key
+            message_ids = [ref["id"] for ref in refs]
+            inbox_key = _prompt_key(self.prompts.inbox_summary, ",".join(message_ids))
+            summary = _prompt_cache().get(inbox_key)
+            if summary is None:
+                messages = self._fetch_messages_batch(message_ids)
+                content = self._format_messages_for_summary(messages)
+                summary = self._run_prompt(self.prompts.inbox_summary, content)
+                _prompt_cache().set(inbox_key, summary)
+            return summary
         except HttpError as exc:
             raise EmailAgentError(f"Gmail error: {exc}") from exc
 
@@ -119,7 +157,7 @@ class EmailAgent:
             "id": draft_id,
             "raw": raw,
             "preview": reply_text,
-            "subject": self._get_header(latest, "Subject") or "(no subject)",
+            "subject": self._get_header(latest, "subject") or "(no subject)",
         }
         return {
             "draft_id": draft_id,
@@ -145,17 +183,39 @@ class EmailAgent:
     def has_pending_draft(self) -> bool:
         return self.pending_draft is not None
 
+    def warm_up(self) -> None:
+        """Build the Gmail client early when stored credentials exist.
+
+        Never starts the interactive OAuth flow: unless the stored token is
+        valid or refreshable this is a no-op.
+        """
+        try:
+            creds = self._stored_credentials()
+        except ValueError:
+            # Malformed token file; the first real request reports it
+            return
+        if creds and (creds.valid or (creds.expired and creds.refresh_token)):
+            self._get_service(creds)
+
     # ---------- Gmail helpers ----------
 
-    def _get_service(self):
+    def _get_service(self, creds=None):
         if self._service is None:
-            self._service = self._build_service()
+            key = str(self.token_path)
+            with _SERVICE_LOCK:
+                if key not in _SERVICE_CACHE:
+                    _SERVICE_CACHE[key] = self._build_service(creds)
+                self._service = _SERVICE_CACHE[key]
         return self._service
 
-    def _build_service(self):
-        creds = None
-        if self.token_path.exists():
-            creds = Credentials.from_authorized_user_file(str(self.token_path), SCOPES)
+    def _stored_credentials(self):
+        if not self.token_path.exists():
+            return None
+        return Credentials.from_authorized_user_file(str(self.token_path), SCOPES)
+
+    def _build_service(self, creds=None):
+        if creds is None:
+            creds = self._stored_credentials()
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
                 creds.refresh(Request())
@@ -170,11 +230,45 @@ class EmailAgent:
                 )
                 creds = flow.run_local_server(port=0)
             self.token_path.write_text(creds.to_json())
-        return build("gmail", "v1", credentials=creds, cache_discovery=False)
+        # Use the discovery document bundled with googleapiclient instead of fetching it
+        return build("gmail", "v1", credentials=creds, cache_discovery=False, static_discovery=True)
+
+    def _summary_request(self, message_id: str):
+        # Partial response: only the headers and snippet the inbox summary reads
+        return self._get_service().users().messages().get(
+            userId="me",
+            id=message_id,
+            format="metadata",
+            metadataHeaders=["From", "Subject", "Date"],
+            fields="id,snippet,payload/headers",
+        )
+
+    def _fetch_messages_batch(self, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch summary metadata for many messages in one batched HTTP request."""
+        messages = self._execute_batch([self._summary_request(message_id) for message_id in message_ids])
+        return [self._normalize_headers(message) for message in messages]
 
-    def _fetch_message(self, message_id: str) -> Dict[str, Any]:
+    def _execute_batch(self, requests: List[Any]) -> List[Dict[str, Any]]:
+        """Run API requests as batched HTTP calls; responses keep the request order."""
         service = self._get_service()
-        return service.users().messages().get(userId="me", id=message_id, format="full").execute()
+        results: Dict[str, Dict[str, Any]] = {}
+        errors: List[HttpError] = []
+
+        def _collect(request_id, response, exception):
+            if exception is not None:
+                errors.append(exception)
+            else:
+                results[request_id] = response
+
+        # Gmail caps a batch at 100 calls
+        for start in range(0, len(requests), 100):
+            batch = service.new_batch_http_request(callback=_collect)
+            for offset, request in enumerate(requests[start:start + 100]):
+                batch.add(request, request_id=str(start + offset))
+            batch.execute()
+        if errors:
+            raise errors[0]
+        return [results[str(i)] for i in range(len(requests))]
 
     def _find_thread(self, query: str) -> Optional[Dict[str, Any]]:
         try:
@@ -184,7 +278,10 @@ class EmailAgent:
             if not refs:
                 return None
             thread_id = refs[0]["threadId"]
-            return service.users().threads().get(userId="me", id=thread_id, format="full").execute()
+            thread = service.users().threads().get(
+                userId="me", id=thread_id, format="full", fields=_THREAD_FIELDS
+            ).execute()
+            return self._normalize_thread(thread)
         except HttpError as exc:
             raise EmailAgentError(f"Gmail error while searching: {exc}") from exc
 
@@ -193,8 +290,8 @@ class EmailAgent:
     def _format_messages_for_summary(self, messages: List[Dict[str, Any]]) -> str:
         chunks = []
         for message in messages:
-            sender = self._get_header(message, "From") or "Unknown sender"
-            subject = self._get_header(message, "Subject") or "(no subject)"
+            sender = self._get_header(message, "from") or "Unknown sender"
+            subject = self._get_header(message, "subject") or "(no subject)"
             snippet = message.get("snippet", "")
             chunks.append(f"From: {sender}\nSubject: {subject}\nSnippet: {snippet}\n---")
         return "\n".join(chunks)
@@ -202,18 +299,24 @@ class EmailAgent:
     def _format_thread(self, thread: Dict[str, Any]) -> str:
         entries = []
         for message in thread.get("messages", []):
-            sender = self._get_header(message, "From")
-            date = self._get_header(message, "Date")
+            sender = self._get_header(message, "from")
+            date = self._get_header(message, "date")
             body = self._extract_plain_text(message)
             entries.append(f"[{date}] {sender}:\n{body}\n")
         return "\n".join(entries)
 
     def _run_prompt(self, system_prompt: str, user_content: str) -> str:
+        key = _prompt_key(system_prompt, user_content)
+        cached = _prompt_cache().get(key)
+        if cached is not None:
+            return cached
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_content},
         ]
-        return chat_completion(messages).strip()
+        reply = chat_completion(messages).strip()
+        _prompt_cache().set(key, reply)
+        return reply
 
     def _build_reply(self, latest_message: Dict[str, Any], reply_text: str) -> EmailMessage:
         if not self.sender_address:
@@ -221,9 +324,9 @@ class EmailAgent:
         reply = EmailMessage()
         reply["To"] = self._extract_reply_to(latest_message)
         reply["From"] = self.sender_address
-        subject = self._get_header(latest_message, "Subject") or "(no subject)"
+        subject = self._get_header(latest_message, "subject") or "(no subject)"
         reply["Subject"] = subject if subject.lower().startswith("re:") else f"Re: {subject}"
-        msg_id = self._get_header(latest_message, "Message-ID")
+        msg_id = self._get_header(latest_message, "message-id")
         if msg_id:
             reply["In-Reply-To"] = msg_id
             reply["References"] = msg_id
@@ -232,26 +335,59 @@ class EmailAgent:
 
     # ---------- Utility ----------
 
+    def _normalize_headers(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Lowercase header names in place and memoize the lookup dict; done once per fetch."""
+        if "_headers_cache" not in message:
+            lookup: Dict[str, str] = {}
+            for header in message.get("payload", {}).get("headers", []):
+                header["name"] = name = header.get("name", "").lower()
+                # Keep the first occurrence, matching the previous linear scan
+                lookup.setdefault(name, header.get("value", ""))
+            message["_headers_cache"] = lookup
+        return message
+
+    def _normalize_thread(self, thread: Dict[str, Any]) -> Dict[str, Any]:
+        for message in thread.get("messages", []):
+            self._normalize_headers(message)
+        return thread
+
+    def _headers_dict(self, message: Dict[str, Any]) -> Dict[str, str]:
+        return self._normalize_headers(message)["_headers_cache"]
+
     def _get_header(self, message: Dict[str, Any], name: str) -> str:
-        headers = message.get("payload", {}).get("headers", [])
-        for header in headers:
-            if header.get("name", "").lower() == name.lower():
-                return header.get("value", "")
-        return ""
+        # Callers pass lowercase names, matching the normalized headers
+        return self._headers_dict(message).get(name, "")
 
     def _extract_plain_text(self, message: Dict[str, Any]) -> str:
         payload = message.get("payload", {})
         data = payload.get("body", {}).get("data")
-        if data:
-            return base64.urlsafe_b64decode(data).decode(errors="ignore")
+        # An HTML-only body isn't worth decoding for the prompt; the snippet stands in
+        if data and payload.get("mimeType") != "text/html":
+            return self._decode_body(data)
         for part in payload.get("parts", []) or []:
             mime = part.get("mimeType")
             if mime == "text/plain":
                 part_data = part.get("body", {}).get("data")
                 if part_data:
-                    return base64.urlsafe_b64decode(part_data).decode(errors="ignore")
+                    return self._decode_body(part_data)
         return message.get("snippet", "")
 
+    def _decode_body(self, data: str) -> str:
+        # Base64 decodes in independent 4-char groups, so long bodies can be cut
+        # before decoding; only the first EMAIL_MAX_BODY_CHARS bytes reach the prompt
+        limit = -(-Config.load().email_max_body_chars * 4 // 3)
+        limit += -limit % 4
+        truncated = len(data) > limit
+        if truncated:
+            data = data[:limit]
+        raw = binascii.a2b_base64(data.encode("ascii").translate(_URLSAFE_TAB) + b"=" * (-len(data) % 4))
+        # Most bodies are plain ASCII, which decodes without the UTF-8 error handler
+        try:
+            text = raw.decode("ascii")
+        except UnicodeDecodeError:
+            text = raw.decode("utf-8", errors="ignore")
+        return f"{text}… [truncated]" if truncated else text
+
     def _extract_reply_to(self, message: Dict[str, Any]) -> str:
-        reply_to = self._get_header(message, "Reply-To")
-        return reply_to or self._get_header(message, "From")
+        reply_to = self._get_header(message, "reply-to")
+        return reply_to or self._get_header(message, "from")
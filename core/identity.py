@@ -1,35 +1,123 @@
+import hashlib
 import os
-import yaml
+from functools import lru_cache
 from pathlib import Path
 
+import orjson
+import yaml
+
+# libyaml's C loader is much faster than the pure-Python one when available
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader  # type: ignore
+
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DEFAULT_PROFILE = PROJECT_ROOT / "identity" / "example_profile.yaml"
 PERSONAL_PROFILE = PROJECT_ROOT / "identity" / "ronald_profile.yaml"
+PROMPT_CACHE_DIR = Path(os.getenv("XDG_CACHE_HOME", "~/.cache")).expanduser() / "mini-me"
+_SYSTEM_PROMPTS: dict = {}
+# Part of the on-disk prompt cache key: bump whenever the rendered prompt's
+# format changes (template text, profile serialization), so old copies are ignored
+_PROMPT_FORMAT_VERSION = 2
 
-def load_profile():
+def _profile_path() -> Path:
     # Allow override from env
     profile_path = os.getenv("PROFILE_PATH")
     if profile_path:
-        p = Path(profile_path).expanduser()
-        return yaml.safe_load(p.read_text(encoding="utf-8"))
+        return Path(profile_path).expanduser()
 
     # Prefer personal profile if it exists locally, else use example
     if PERSONAL_PROFILE.exists():
-        return yaml.safe_load(PERSONAL_PROFILE.read_text(encoding="utf-8"))
+        return PERSONAL_PROFILE
+
+    return DEFAULT_PROFILE
+
+@lru_cache(maxsize=4)
+def _load_cached(path: str, mtime: float) -> dict:
+    # A JSON copy of the parsed YAML loads far faster on later cold starts;
+    # it's only trusted while it is at least as new as the source file
+    cache_file = PROMPT_CACHE_DIR / f"profile.{hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]}.json"
+    try:
+        if cache_file.stat().st_mtime >= mtime:
+            return orjson.loads(cache_file.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        pass
 
-    return yaml.safe_load(DEFAULT_PROFILE.read_text(encoding="utf-8"))
+    data = yaml.load(Path(path).read_text(encoding="utf-8"), Loader=_Loader)
+    try:
+        payload = orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # Unserializable data: plain YAML every time
+        return data
+    # Return the JSON round-trip, so dates and non-string keys come back as
+    # strings here exactly as they do from the cached copy on later runs
+    data = orjson.loads(payload)
+    try:
+        PROMPT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(".tmp")
+        tmp_file.write_bytes(payload)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # A read-only cache dir just means no cache
+        pass
+    return data
+
+def load_profile():
+    # Cached per file version; an edited profile has a new mtime and is re-read
+    p = _profile_path()
+    return _load_cached(str(p), p.stat().st_mtime)
 
 def build_system_prompt(profile: dict) -> str:
+    # Memoized on the profile's content so repeat builds skip the dict repr
+    serialized = _dumps_profile(profile)
+    key = hashlib.blake2b(serialized, digest_size=16).digest()
+    prompt = _SYSTEM_PROMPTS.get(key)
+    if prompt is None:
+        if len(_SYSTEM_PROMPTS) >= 8:
+            _SYSTEM_PROMPTS.clear()
+        prompt = _SYSTEM_PROMPTS[key] = _render_system_prompt(serialized.decode("utf-8"))
+    return prompt
+
+def _dumps_profile(profile: dict) -> bytes:
+    # Compact, key-sorted JSON: stable across runs (keeps the prompt prefix
+    # cacheable upstream) and fewer tokens than the dict repr
+    return orjson.dumps(profile, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+def _render_system_prompt(profile_json: str) -> str:
     # Keep this concise; avoid dumping the entire YAML verbatim long-term.
     return f"""
 You are a personal AI assistant acting as a second brain.
 Follow the user's tone, communication style, preferences, and guardrails in the profile.
 
 Profile (structured):
-{profile}
+{profile_json}
 
 Rules:
 - Respond in the user's voice.
 - Be clear, practical, and risk-aware.
 - If unsure, state assumptions.
 """
+
+def load_system_prompt() -> str:
+    """Build the system prompt, reusing a copy cached on disk while the profile is unchanged."""
+    raw = _profile_path().read_bytes()
+    # Key on the profile bytes and the prompt format so edits to either invalidate the cache
+    digest = hashlib.sha256(f"v{_PROMPT_FORMAT_VERSION}\x1f".encode("utf-8") + raw).hexdigest()
+    cache_file = PROMPT_CACHE_DIR / f"system_prompt.{digest[:16]}.txt"
+    try:
+        return cache_file.read_text(encoding="utf-8")
+    except OSError:
+        pass
+
+    # Miss: parse via load_profile, which reuses its JSON copy of the YAML when current
+    prompt = build_system_prompt(load_profile())
+    try:
+        PROMPT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(".tmp")
+        tmp_file.write_text(prompt, encoding="utf-8")
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # A read-only home directory just means no cache
+        pass
+    return prompt
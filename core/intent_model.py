@@ -0,0 +1,81 @@
+"""Optional local intent classifier backed by a small ONNX model.
+
+Expects a sequence-classification export (e.g. MiniLM fine-tuned on the
+assistant's intents) at models/intent-minilm.onnx with its tokenizer files in
+models/intent-minilm/. Override with INTENT_MODEL_PATH / INTENT_TOKENIZER_PATH
+(read through Config).
+When onnxruntime, transformers, or the model files are missing, classify()
+returns None and callers fall back to the LLM.
+"""
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .config import Config
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MODEL_PATH = PROJECT_ROOT / "models" / "intent-minilm.onnx"
+DEFAULT_TOKENIZER_PATH = PROJECT_ROOT / "models" / "intent-minilm"
+
+# Output order of the classifier head.
+INTENT_LABELS = ("task", "note", "draft_reply", "question", "other", "email")
+
+_SESSION = None
+_TOKENIZER = None
+# numpy, onnxruntime and transformers are imported in _load(), only once the
+# model files are known to exist, so plain imports of this module stay cheap
+np = None
+_LOAD_ATTEMPTED = False
+_LOAD_LOCK = threading.Lock()
+
+
+def _load() -> bool:
+    """Load the ONNX session and tokenizer once per process."""
+    global _SESSION, _TOKENIZER, _LOAD_ATTEMPTED, np
+    with _LOAD_LOCK:
+        if _LOAD_ATTEMPTED:
+            return _SESSION is not None
+        _LOAD_ATTEMPTED = True
+
+        config = Config.load()
+        model_path = Path(config.intent_model_path or DEFAULT_MODEL_PATH)
+        tokenizer_path = Path(config.intent_tokenizer_path or DEFAULT_TOKENIZER_PATH)
+        if not model_path.exists() or not tokenizer_path.exists():
+            return False
+        try:
+            import numpy
+            import onnxruntime
+            from transformers import AutoTokenizer
+        except ImportError:
+            return False
+        np = numpy
+        try:
+            _SESSION = onnxruntime.InferenceSession(
+                str(model_path), providers=["CPUExecutionProvider"]
+            )
+            _TOKENIZER = AutoTokenizer.from_pretrained(str(tokenizer_path))
+        except Exception as exc:
+            print(f"Warning: Local intent model unavailable: {exc}")
+            _SESSION = None
+            _TOKENIZER = None
+        return _SESSION is not None
+
+
+def classify(text: str) -> Optional[Tuple[str, float]]:
+    """Return (intent, probability) from the local model, or None if it isn't available."""
+    if not text or not _load():
+        return None
+
+    encoded = _TOKENIZER(text, truncation=True, max_length=128, return_tensors="np")
+    feeds = {
+        node.name: encoded[node.name].astype(np.int64)
+        for node in _SESSION.get_inputs()
+        if node.name in encoded
+    }
+    logits = _SESSION.run(None, feeds)[0][0]
+    exp = np.exp(logits - logits.max())
+    probs = exp / exp.sum()
+    best = int(np.argmax(probs))
+    return INTENT_LABELS[best], float(probs[best])
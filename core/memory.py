@@ -1,12 +1,19 @@
 import asyncio
+import heapq
 import inspect
 import os
 import re
+import sys
+import threading
+import time
+from collections import Counter
+from itertools import chain
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from uuid import uuid4
 
-from dotenv import load_dotenv
+from .config import Config, load_env as _load_env
+from .openai_client import get_http_client
 
 # Try to import memori and sqlalchemy, but make it optional
 try:
@@ -26,23 +33,19 @@ except (ImportError, ModuleNotFoundError) as e:
     _import_error = str(e)
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
-ENV_PATH = PROJECT_ROOT / ".env"
 MEMORY_DB_PATH = PROJECT_ROOT / "memory.db"
 
+# SQLAlchemy engines keyed by connection string
+_ENGINES: Dict[str, Any] = {}
+_ENGINES_LOCK = threading.Lock()
+
+_WORD_RE = re.compile(r"\w+")
 _STOPWORDS = {
     "i", "me", "my", "you", "your", "the", "and", "but", "for",
     "are", "about", "that", "this", "with", "have", "what", "when",
     "who", "how", "why", "which", "favorite", "favourite"
 }
 
-def _load_env():
-    """Load environment variables from .env file if present."""
-    if ENV_PATH.exists():
-        load_dotenv(dotenv_path=ENV_PATH, override=True)
-    else:
-        load_dotenv(override=True)
-
-
 class MemoryManager:
     """Manages short-term and long-term memory using Memori AI."""
     
@@ -67,6 +70,25 @@ class MemoryManager:
         self.namespace = namespace or agent_id
         self.entity_id: Optional[int] = None
         self.process_record_id: Optional[int] = None
+        # Event loops for resolving coroutine responses, reused per thread
+        self._thread_state = threading.local()
+        self._loops: List[asyncio.AbstractEventLoop] = []
+        self._loops_lock = threading.Lock()
+        # Long-lived autocommit connection for the per-turn fact lookup
+        self._ro_conn = None
+        self._ro_lock = threading.Lock()
+        # Recent facts are reused for a few seconds; (fetched_at, limit, facts, postings)
+        self._facts_cache: Optional[Tuple[float, int, List[str], Dict[str, List[int]]]] = None
+        config = Config.load()
+        self._facts_ttl = config.memory_facts_ttl
+        # How many recent facts are ranked per turn; scoring cost grows with hits, not this
+        self._facts_limit = config.memory_facts_limit
+        self._facts_stmt = text(
+            "SELECT content FROM memori_entity_fact "
+            "WHERE entity_id = :entity_id "
+            "ORDER BY date_last_time DESC "
+            "LIMIT :limit"
+        )
         
         # Get OpenAI API key (required by Memori)
         openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -92,12 +114,17 @@ class MemoryManager:
         # Create SQLAlchemy engine with SQLite-specific settings
         # Use check_same_thread=False for SQLite to allow multiple threads
         # Use autocommit=False and autoflush=True for better transaction control
-        engine = create_engine(
-            db_connection,
-            connect_args={"check_same_thread": False} if "sqlite" in db_connection else {},
-            echo=False,  # Set to True for SQL debugging
-            pool_pre_ping=True,  # Verify connections before using
-        )
+        # Engines (and their connection pools) are shared by every manager on the same database
+        with _ENGINES_LOCK:
+            engine = _ENGINES.get(db_connection)
+            if engine is None:
+                engine = _ENGINES[db_connection] = create_engine(
+                    db_connection,
+                    connect_args={"check_same_thread": False} if "sqlite" in db_connection else {},
+                    echo=False,  # Set to True for SQL debugging
+                    pool_pre_ping=True,  # Verify connections before using
+                    query_cache_size=512,  # Keep compiled forms of the hot memory queries
+                )
         Session = sessionmaker(bind=engine, autocommit=False, autoflush=True)
         self.Session = Session  # Store session factory
         self.session = Session()  # Store session for reuse
@@ -111,7 +138,8 @@ class MemoryManager:
             raise
         
         # Create a single OpenAI client that Memori wraps so that calls are tracked
-        self.openai_client = OpenAI(api_key=openai_api_key)
+        # (its own instance, since Memori patches it, but on the shared connection pool)
+        self.openai_client = OpenAI(api_key=openai_api_key, http_client=get_http_client())
         self.memori.openai.register(self.openai_client)
         
         # Set attribution (entity_id = agent, process_id = namespace)
@@ -126,9 +154,10 @@ class MemoryManager:
             print(f"Debug: Storage build warning: {e}")
             # Try to continue anyway - schema might already exist
         
-        # Cache numeric IDs so we can read/write memories directly
-        self.entity_id = self._get_or_create_record_id("memori_entity", self.agent_id)
-        self.process_record_id = self._get_or_create_record_id("memori_process", self.namespace)
+        # Cache numeric IDs so we can read/write memories directly (one transaction for both)
+        with engine.begin() as conn:
+            self.entity_id = self._get_or_create_record_id("memori_entity", self.agent_id, conn)
+            self.process_record_id = self._get_or_create_record_id("memori_process", self.namespace, conn)
     
     def get_relevant_memories(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
@@ -160,7 +189,7 @@ class MemoryManager:
         """
         # Memori v3 automatically captures conversations through its OpenAI integration
         # Manual storage may not be needed, but we keep this for explicit storage if needed
-        pass
+        self._invalidate_facts()
     
     def add_conversation(self, user_message: str, assistant_reply: str):
         """
@@ -173,7 +202,8 @@ class MemoryManager:
             assistant_reply: The assistant's reply
         """
         # Memori v3 automatically captures conversations when using its OpenAI wrapper
-        # No manual storage needed
+        # No manual storage needed; facts Memori extracts later are picked up once
+        # the recent-facts cache expires
         pass
     
     def get_conversation_history(self, limit: int = 20) -> List[Dict[str, Any]]:
@@ -209,11 +239,12 @@ class MemoryManager:
         Returns:
             Context string suitable for injecting into the LLM prompt
         """
-        if not user_message or not self.entity_id:
+        # Too short to carry a keyword worth matching
+        if not user_message or len(user_message.strip()) < 3 or not self.entity_id:
             return ""
         
         try:
-            facts = self._fetch_recent_facts(limit=25)
+            facts, postings = self._fetch_fact_index(limit=self._facts_limit)
         except Exception as exc:
             print(f"Warning: Failed to fetch memories: {exc}")
             return ""
@@ -221,27 +252,23 @@ class MemoryManager:
         if not facts:
             return ""
         
-        keywords = {
-            token for token in re.findall(r"\w+", user_message.lower())
-            if len(token) > 2 and token not in _STOPWORDS
-        }
+        tokens = _WORD_RE.findall(user_message.lower())
+        keywords = {token for token in tokens if len(token) > 2 and token not in _STOPWORDS}
         if not keywords:
-            keywords = set(re.findall(r"\w+", user_message.lower()))
-        
-        scored: List[tuple[float, str]] = []
-        for idx, fact in enumerate(facts):
-            lowered = fact.lower()
-            score = sum(1 for kw in keywords if kw in lowered)
-            score += max(0.0, (len(facts) - idx) * 0.01)
-            scored.append((score, fact))
-        
-        scored.sort(key=lambda item: item[0], reverse=True)
-        relevant = [fact for score, fact in scored if score > 0][:5]
-        if not relevant:
-            relevant = facts[:3]
-        
-        if not relevant:
-            return ""
+            keywords = set(tokens)
+        
+        # Each posting is a fact containing the keyword, so the counter holds
+        # the number of distinct keywords per fact; only matching facts are touched.
+        hits = Counter(chain.from_iterable(postings.get(kw, ()) for kw in keywords))
+        # More keyword hits first, then recency (facts arrive newest first)
+        ranked = heapq.nsmallest(5, hits, key=lambda idx: (-hits[idx], idx))
+        # Any keyword hit outranks the recency bonus, so top up with the newest misses
+        for idx in range(len(facts)):
+            if len(ranked) >= 5:
+                break
+            if idx not in hits:
+                ranked.append(idx)
+        relevant = [facts[idx] for idx in ranked]
         
         context_lines = ["Relevant memories:"]
         for fact in relevant:
@@ -250,7 +277,7 @@ class MemoryManager:
         context = "\n".join(context_lines)
         return context[:1500]
     
-    def chat_completion(self, messages, model: str = "gpt-4o-mini", temperature: float = 0.3):
+    def chat_completion(self, messages, model: str = "gpt-4o-mini", temperature: float = 0.3, response_format=None):
         """
         Make a chat completion using the registered OpenAI client.
         Memori automatically captures and retrieves memories through its registration.
@@ -259,69 +286,43 @@ class MemoryManager:
             messages: List of message dictionaries
             model: Model to use
             temperature: Temperature setting
+            response_format: Optional OpenAI response_format (e.g. a strict JSON schema)
             
         Returns:
             Response content string
         """
+        extra = {"response_format": response_format} if response_format else {}
         try:
             # Ensure session is in a clean state before making the call
-            # Rollback any pending transactions to avoid conflicts
-            try:
-                if self.session.is_active:
-                    self.session.rollback()
-            except Exception:
-                # If rollback fails, the session might be in a bad state
-                # Close it and create a new one
-                try:
-                    self.session.close()
-                except Exception:
-                    pass
-                self.session = self.Session()
-                # Re-initialize Memori with the new session
-                self.memori = Memori(conn=self.session)
-                self.memori.openai.register(self.openai_client)
-                self.memori.attribution(entity_id=self.agent_id, process_id=self.namespace)
+            self._prepare_session()
             
             # Use the registered OpenAI client directly
             # Memori automatically captures conversations through its registration
             response = self.openai_client.chat.completions.create(
                 model=model,
                 messages=messages,
-                temperature=temperature
+                temperature=temperature,
+                **extra
             )
             response = self._ensure_response_ready(response)
             
             # After the call, ensure session is clean for next operation
-            try:
-                if self.session.is_active:
-                    self.session.commit()
-            except Exception:
-                # If commit fails, rollback to clean state
-                try:
-                    self.session.rollback()
-                except Exception:
-                    pass
+            self._commit_session()
             
             return response.choices[0].message.content
         except Exception as e:
             # If there's a session error, try to recover
             error_msg = str(e)
             if "commit" in error_msg.lower() or "transaction" in error_msg.lower():
-                # Session transaction error - recover by creating new session
-                try:
-                    self.session.close()
-                except Exception:
-                    pass
-                self.session = self.Session()
-                self.memori = Memori(conn=self.session)
-                self.memori.openai.register(self.openai_client)
-                self.memori.attribution(entity_id=self.agent_id, process_id=self.namespace)
+                # Session transaction error - recover by resetting the session
+                self._reset_session()
                 
                 # Retry the call
                 response = self.openai_client.chat.completions.create(
                     model=model,
                     messages=messages,
-                    temperature=temperature
+                    temperature=temperature,
+                    **extra
                 )
                 response = self._ensure_response_ready(response)
                 return response.choices[0].message.content
@@ -329,8 +330,73 @@ class MemoryManager:
                 # Re-raise if it's not a session error
                 raise
     
+    def chat_completion_stream(self, messages, model: str = "gpt-4o-mini", temperature: float = 0.3, response_format=None):
+        """
+        Streaming variant of chat_completion that yields content deltas.
+        
+        Args:
+            messages: List of message dictionaries
+            model: Model to use
+            temperature: Temperature setting
+            response_format: Optional OpenAI response_format (e.g. a strict JSON schema)
+            
+        Yields:
+            Response content chunks as they arrive
+        """
+        extra = {"response_format": response_format} if response_format else {}
+        # Start from a clean session so Memori can record the exchange
+        self._prepare_session()
+        
+        stream = self.openai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            **extra,
+        )
+        stream = self._ensure_response_ready(stream)
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        
+        self._commit_session()
+    
     # ----- Internal helpers -----
     
+    def _prepare_session(self):
+        """Rollback any pending transaction, rebuilding the session if it is unusable."""
+        try:
+            if self.session.is_active:
+                self.session.rollback()
+        except Exception:
+            # If rollback fails, the session might be in a bad state
+            self._reset_session()
+    
+    def _reset_session(self):
+        """
+        Return the session to a clean state after an error.
+        
+        Memori's storage adapter is bound to this Session object, so it is
+        closed (releasing its connection and transaction) and reused rather
+        than replaced; no Memori rebuild or schema probe is needed.
+        """
+        try:
+            self.session.close()
+        except Exception:
+            pass
+    
+    def _commit_session(self):
+        """Commit after a call so the session is clean for the next operation."""
+        try:
+            if self.session.is_active:
+                self.session.commit()
+        except Exception:
+            # If commit fails, rollback to clean state
+            try:
+                self.session.rollback()
+            except Exception:
+                pass
+    
     def _ensure_response_ready(self, response):
         """Make sure the response is resolved even if the client returned a coroutine."""
         if inspect.iscoroutine(response):
@@ -338,43 +404,68 @@ class MemoryManager:
         return response
     
     def _run_coroutine_sync(self, coro):
-        """Run a coroutine to completion using a dedicated event loop."""
-        loop = asyncio.new_event_loop()
-        try:
-            return loop.run_until_complete(coro)
-        finally:
-            loop.close()
+        """Run a coroutine to completion on this thread's reusable event loop."""
+        # One loop per thread: calls arrive from executor threads, and a loop
+        # can't run_until_complete on two threads at once
+        loop = getattr(self._thread_state, "loop", None)
+        if loop is None or loop.is_closed():
+            loop = asyncio.new_event_loop()
+            self._thread_state.loop = loop
+            with self._loops_lock:
+                self._loops.append(loop)
+        return loop.run_until_complete(coro)
 
     def _fetch_recent_facts(self, limit: int = 20) -> List[str]:
         """
         Fetch recent Memori facts for the current entity.
         """
+        return self._fetch_fact_index(limit)[0]
+    
+    def _fetch_fact_index(self, limit: int = 20) -> Tuple[List[str], Dict[str, List[int]]]:
+        """
+        Fetch recent facts together with an inverted index of token -> fact positions.
+        
+        Both are cached for the facts TTL, so facts are tokenized once per refresh.
+        """
         if text is None or not self.entity_id:
-            return []
+            return [], {}
         
         engine = self.session.bind
         if engine is None:
-            return []
+            return [], {}
         
-        stmt = text(
-            "SELECT content FROM memori_entity_fact "
-            "WHERE entity_id = :entity_id "
-            "ORDER BY date_last_time DESC "
-            "LIMIT :limit"
-        )
-        params = {"entity_id": self.entity_id, "limit": limit}
-        try:
-            with engine.begin() as conn:
-                rows = conn.execute(stmt, params).fetchall()
-        except Exception as exc:
-            print(f"Warning: Failed to query stored facts: {exc}")
-            return []
+        cached = self._facts_cache
+        if cached and cached[1] == limit and time.monotonic() - cached[0] < self._facts_ttl:
+            return cached[2], cached[3]
         
-        return [row[0] for row in rows if row and row[0]]
+        params = {"entity_id": self.entity_id, "limit": limit}
+        # Read-only query: reuse one autocommit connection instead of a BEGIN/COMMIT per turn
+        with self._ro_lock:
+            try:
+                if self._ro_conn is None:
+                    self._ro_conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+                rows = self._ro_conn.execute(self._facts_stmt, params).fetchall()
+            except Exception as exc:
+                print(f"Warning: Failed to query stored facts: {exc}")
+                self._close_ro_conn()
+                return [], {}
+        
+        facts = [row[0] for row in rows if row and row[0]]
+        postings: Dict[str, List[int]] = {}
+        for idx, fact in enumerate(facts):
+            for token in set(_WORD_RE.findall(fact.lower())):
+                postings.setdefault(sys.intern(token), []).append(idx)
+        self._facts_cache = (time.monotonic(), limit, facts, postings)
+        return facts, postings
+    
+    def _invalidate_facts(self):
+        self._facts_cache = None
 
-    def _get_or_create_record_id(self, table: str, external_id: str) -> Optional[int]:
+    def _get_or_create_record_id(self, table: str, external_id: str, conn=None) -> Optional[int]:
         """
         Resolve the numeric ID for Memori tables like memori_entity/process.
+        
+        Pass conn to run inside an existing transaction.
         """
         if text is None or not external_id:
             return None
@@ -382,29 +473,47 @@ class MemoryManager:
         if table not in {"memori_entity", "memori_process"}:
             raise ValueError(f"Unsupported table lookup: {table}")
         
-        engine = self.session.bind
-        if engine is None:
-            return None
-        
-        select_stmt = text(
-            f"SELECT id FROM {table} WHERE external_id = :external_id"
-        )
-        insert_stmt = text(
-            f"INSERT INTO {table} (uuid, external_id) VALUES (:uuid, :external_id)"
-        )
+        if conn is None:
+            engine = self.session.bind
+            if engine is None:
+                return None
+            with engine.begin() as conn:
+                return self._get_or_create_record_id(table, external_id, conn)
         
-        with engine.begin() as conn:
-            row = conn.execute(select_stmt, {"external_id": external_id}).fetchone()
-            if row:
-                return row[0]
-            conn.execute(insert_stmt, {"uuid": str(uuid4()), "external_id": external_id})
-            row = conn.execute(select_stmt, {"external_id": external_id}).fetchone()
-            return row[0] if row else None
+        # external_id is unique, so an ignored insert plus one select replaces
+        # the select/insert/select round-trips
+        if conn.dialect.name == "mysql":
+            insert_sql = f"INSERT IGNORE INTO {table} (uuid, external_id) VALUES (:uuid, :external_id)"
+        else:
+            insert_sql = (
+                f"INSERT INTO {table} (uuid, external_id) VALUES (:uuid, :external_id) "
+                "ON CONFLICT (external_id) DO NOTHING"
+            )
+        conn.execute(text(insert_sql), {"uuid": str(uuid4()), "external_id": external_id})
+        row = conn.execute(
+            text(f"SELECT id FROM {table} WHERE external_id = :external_id"),
+            {"external_id": external_id},
+        ).fetchone()
+        return row[0] if row else None
+    
+    def _close_ro_conn(self):
+        if self._ro_conn is not None:
+            try:
+                self._ro_conn.close()
+            except Exception:
+                pass
+            self._ro_conn = None
     
     def cleanup(self):
         """Clean up resources if needed."""
-        # Memori handles its own cleanup, but we can add custom cleanup here if needed
-        pass
+        # Memori handles its own cleanup; the read connection and loops are ours to close
+        with self._ro_lock:
+            self._close_ro_conn()
+        with self._loops_lock:
+            for loop in self._loops:
+                if not loop.is_running():
+                    loop.close()
+            self._loops.clear()
 
 
 # Global memory managers cache (keyed by agent_id)
@@ -1,34 +1,283 @@
+import asyncio
+import hashlib
+import importlib.util
+import json
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-from openai import OpenAI
+import threading
+import time
+import weakref
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+import httpx
+from openai import AsyncOpenAI, OpenAI
 
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
-ENV_PATH = PROJECT_ROOT / ".env"
+from .cache import LRUCache
+from .config import Config
 
-def _load_env():
-    # Load project .env if present; do not fail if missing.
-    if ENV_PATH.exists():
-        load_dotenv(dotenv_path=ENV_PATH, override=True)
-    else:
-        load_dotenv(override=True)
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None  # type: ignore
 
-def get_client() -> OpenAI:
-    _load_env()
+# httpx only speaks HTTP/2 when the h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+def _env_loaded() -> bool:
+    # .env is parsed once per process (by Config.load); config.reload_env() forces a re-read
+    Config.load()
+    return True
+
+def _default_model() -> str:
+    return Config.load().model
+
+_CLIENT: Optional[OpenAI] = None
+_HTTP_CLIENT: Optional[httpx.Client] = None
+_CLIENT_LOCK = threading.Lock()
+
+# Sized for the concurrent Telegram path: every pooled connection stays warm.
+# Completions can legitimately take tens of seconds, so only connect is tight.
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=64, keepalive_expiry=60)
+_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+def get_http_client() -> httpx.Client:
+    """Shared keep-alive connection pool for every OpenAI client in the process."""
+    global _HTTP_CLIENT
+    with _CLIENT_LOCK:
+        if _HTTP_CLIENT is None:
+            _HTTP_CLIENT = httpx.Client(http2=HTTP2_AVAILABLE, timeout=_HTTP_TIMEOUT, limits=_HTTP_LIMITS)
+        return _HTTP_CLIENT
+
+def _api_key() -> str:
+    _env_loaded()
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError(
             "OPENAI_API_KEY is not set. Add it to your environment or a .env file in the project root."
         )
-    return OpenAI(api_key=api_key)
+    return api_key
+
+def get_client() -> OpenAI:
+    global _CLIENT
+    if _CLIENT is not None:
+        return _CLIENT
+    api_key = _api_key()
+    http_client = get_http_client()
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = OpenAI(api_key=api_key, http_client=http_client)
+        return _CLIENT
+
+# Async connection pools are bound to an event loop, so there is one client per loop.
+# Meant for long-lived loops (the Telegram bot): the client references its loop,
+# so an entry is never collected. Short asyncio.run() callers use the sync client.
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+def get_async_client() -> AsyncOpenAI:
+    """Async client for the running event loop, created on first use in that loop."""
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        http_client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, timeout=_HTTP_TIMEOUT, limits=_HTTP_LIMITS)
+        client = _ASYNC_CLIENTS[loop] = AsyncOpenAI(api_key=_api_key(), http_client=http_client)
+    return client
+
+# Exact-match cache for deterministic (temperature == 0) completions.
+_response_cache = LRUCache(maxsize=512)
+stats: Dict[str, int] = _response_cache.stats
+
+def _completion_kwargs(response_format) -> Dict:
+    # response_format constrains the output to JSON (optionally a strict schema)
+    return {"response_format": response_format} if response_format else {}
 
-def chat_completion(messages):
-    _load_env()
-    model = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+def chat_completion(messages, temperature: float = 0.3, response_format=None, model=None):
+    model = model or _default_model()
     client = get_client()
     response = client.chat.completions.create(
         model=model,
         messages=messages,
-        temperature=0.3,
+        temperature=temperature,
+        **_completion_kwargs(response_format),
     )
     return response.choices[0].message.content
+
+def chat_completion_stream(messages, temperature: float = 0.3, response_format=None, model=None) -> Iterator[str]:
+    model = model or _default_model()
+    client = get_client()
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+        **_completion_kwargs(response_format),
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+async def achat_completion(messages, temperature: float = 0.3, response_format=None, model=None):
+    model = model or _default_model()
+    client = get_async_client()
+    response = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        **_completion_kwargs(response_format),
+    )
+    return response.choices[0].message.content
+
+@lru_cache(maxsize=4)
+def _get_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str) -> int:
+    """Count tokens for the configured model; approximates when tiktoken isn't installed."""
+    if tiktoken is None:
+        return (len(text) + 3) // 4
+    return len(_get_encoding(_default_model()).encode(text))
+
+def embed(text: str, model: str = "text-embedding-3-small"):
+    client = get_client()
+    response = client.embeddings.create(model=model, input=text)
+    return response.data[0].embedding
+
+@lru_cache(maxsize=32)
+def _prefix_hasher(prefix: Tuple[Tuple[str, str], ...]):
+    # Hash state after the static leading messages; callers .copy() it per request.
+    payload = json.dumps([{"role": role, "content": content} for role, content in prefix], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8"))
+
+def _cache_key(messages, temperature: float, response_format=None, model=None, static_prefix: int = 0) -> str:
+    model = model or _default_model()
+    prefix = tuple((m["role"], m["content"]) for m in messages[:static_prefix])
+    hasher = _prefix_hasher(prefix).copy()
+    payload = json.dumps([model, temperature, response_format, messages[static_prefix:]], sort_keys=True)
+    hasher.update(payload.encode("utf-8"))
+    return hasher.hexdigest()
+
+def cached_chat_completion(messages, temperature: float = 0.0, response_format=None, model=None, static_prefix: int = 0):
+    # Only deterministic calls are safe to replay from the cache.
+    if temperature != 0:
+        return chat_completion(messages, temperature=temperature, response_format=response_format, model=model)
+
+    key = _cache_key(messages, temperature, response_format, model, static_prefix)
+    cached = _response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    content = chat_completion(messages, temperature=temperature, response_format=response_format, model=model)
+    if content is not None:
+        _response_cache.set(key, content)
+    return content
+
+async def acached_chat_completion(messages, temperature: float = 0.0, response_format=None, model=None, static_prefix: int = 0):
+    # Async twin of cached_chat_completion; both share the same response cache.
+    if temperature != 0:
+        return await achat_completion(messages, temperature=temperature, response_format=response_format, model=model)
+
+    key = _cache_key(messages, temperature, response_format, model, static_prefix)
+    cached = _response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    content = await achat_completion(messages, temperature=temperature, response_format=response_format, model=model)
+    if content is not None:
+        _response_cache.set(key, content)
+    return content
+
+def cached_chat_completion_stream(messages, temperature: float = 0.0, response_format=None, model=None, static_prefix: int = 0) -> Iterator[str]:
+    # Cache hits are replayed as a single chunk; misses are stored once fully streamed.
+    if temperature != 0:
+        yield from chat_completion_stream(messages, temperature=temperature, response_format=response_format, model=model)
+        return
+
+    key = _cache_key(messages, temperature, response_format, model, static_prefix)
+    cached = _response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    for chunk in chat_completion_stream(messages, temperature=temperature, response_format=response_format, model=model):
+        parts.append(chunk)
+        yield chunk
+    content = "".join(parts)
+    # An empty stream is a failed call, not an answer worth replaying
+    if content:
+        _response_cache.set(key, content)
+
+_BATCH_DONE = {"completed", "failed", "expired", "cancelled"}
+
+class BatchCompletionError(RuntimeError):
+    """Some requests in a batch job failed.
+
+    ``results`` holds the contents that did come back (None where a request
+    failed) and ``errors`` maps each failed request's index to its error.
+    """
+
+    def __init__(self, results: List[Optional[str]], errors: Dict[int, str]):
+        super().__init__(f"{len(errors)} of {len(results)} batch requests failed")
+        self.results = results
+        self.errors = errors
+
+def _batch_error(item: Dict) -> str:
+    response = item.get("response") or {}
+    error = item.get("error") or (response.get("body") or {}).get("error") or {}
+    message = error.get("message") if isinstance(error, dict) else str(error)
+    return f"status {response.get('status_code')}: {message or 'unknown error'}"
+
+def batch_chat_completion(
+    requests: List[list],
+    temperature: float = 0.3,
+    response_format=None,
+    model=None,
+    poll_interval: float = 10.0,
+) -> List[Optional[str]]:
+    """Run many chat completions as one Batch API job; results follow the input order.
+
+    Raises BatchCompletionError (carrying the partial results) if any request failed.
+    """
+    model = model or _default_model()
+    client = get_client()
+
+    lines = []
+    for i, messages in enumerate(requests):
+        body = {"model": model, "messages": messages, "temperature": temperature, **_completion_kwargs(response_format)}
+        lines.append(json.dumps({"custom_id": f"req-{i}", "method": "POST", "url": "/v1/chat/completions", "body": body}))
+    batch_file = client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    while batch.status not in _BATCH_DONE:
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+
+    # Output lines aren't guaranteed to be in input order; match them by custom_id.
+    # Failed requests are written to the error file rather than the output file.
+    results: List[Optional[str]] = [None] * len(requests)
+    errors: Dict[int, str] = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            index = int(item["custom_id"].split("-", 1)[1])
+            response = item.get("response") or {}
+            if item.get("error") or response.get("status_code") != 200:
+                errors[index] = _batch_error(item)
+                continue
+            results[index] = response["body"]["choices"][0]["message"]["content"]
+    for index in range(len(requests)):
+        if results[index] is None and index not in errors:
+            errors[index] = "no result returned"
+    if errors:
+        raise BatchCompletionError(results, errors)
+    return results
@@ -0,0 +1,95 @@
+"""Embedding-based cache for routing decisions on near-duplicate prompts.
+
+Stores normalized prompt embeddings in a NumPy matrix and returns the cached
+value for the most similar prompt when cosine similarity clears a threshold.
+Only side-effect-free decisions should be admitted by callers.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None  # type: ignore
+    NUMPY_AVAILABLE = False
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_PATH = PROJECT_ROOT / ".semantic_cache.npz"
+
+
+class SemanticCache:
+    """Cosine-similarity lookup over a bounded set of cached prompts."""
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        maxsize: int = 256,
+        path: Optional[Path] = DEFAULT_CACHE_PATH,
+    ):
+        if not NUMPY_AVAILABLE:
+            raise ImportError("NumPy is required for the semantic cache. Install with: pip install numpy")
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.path = Path(path) if path else None
+        self._embeddings: Optional["np.ndarray"] = None
+        self._values: List[str] = []
+        self._lock = threading.Lock()
+        self._load()
+
+    def lookup(self, embedding: Sequence[float]) -> Optional[Any]:
+        """Return the cached value for the closest prompt above the threshold."""
+        with self._lock:
+            if self._embeddings is None or not self._values:
+                return None
+            scores = self._embeddings @ self._normalize(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return json.loads(self._values[best])
+
+    def add(self, embedding: Sequence[float], value: Any) -> None:
+        row = self._normalize(embedding)[np.newaxis, :]
+        with self._lock:
+            if self._embeddings is None or self._embeddings.shape[1] != row.shape[1]:
+                self._embeddings = row
+                self._values = []
+            else:
+                self._embeddings = np.vstack([self._embeddings, row])[-self.maxsize:]
+            self._values = (self._values + [json.dumps(value)])[-self.maxsize:]
+            self._persist()
+
+    # ----- Internal helpers -----
+
+    def _normalize(self, embedding: Sequence[float]) -> "np.ndarray":
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _load(self) -> None:
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                self._embeddings = data["embeddings"].astype(np.float32)
+                self._values = [str(value) for value in data["values"]]
+        except Exception as exc:
+            print(f"Warning: Failed to load semantic cache: {exc}")
+            self._embeddings = None
+            self._values = []
+
+    def _persist(self) -> None:
+        if not self.path:
+            return
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as handle:
+                np.savez(handle, embeddings=self._embeddings, values=np.array(self._values))
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            print(f"Warning: Failed to persist semantic cache: {exc}")
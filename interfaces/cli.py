@@ -1,22 +1,29 @@
-import os
 from rich.prompt import Prompt
 from rich.console import Console
-from core.assistant import handle_message
+from core.assistant import handle_message_stream, start_warmup
+from core.config import Config
 
 console = Console()
+_EXIT_WORDS = frozenset(("exit", "quit"))
 
 def run_cli():
     # Get agent ID from environment or use default
     # Since you're the only user, we use a single agent namespace
-    agent_id = os.getenv("AGENT_ID", "main_assistant")
+    agent_id = Config.load().agent_id
+    start_warmup()
     
     console.print("[bold cyan]Mini-Me Assistant CLI[/bold cyan] (type 'exit' to quit)\n")
     console.print(f"[dim]Agent: {agent_id} (set AGENT_ID env var to change)[/dim]\n")
 
     while True:
         user_text = Prompt.ask("[bold green]You[/bold green]")
-        if user_text.strip().lower() in ("exit", "quit"):
+        # Only short inputs can be an exit word; skip lowercasing long messages
+        command = user_text.strip()
+        if len(command) <= 4 and command.lower() in _EXIT_WORDS:
             break
 
-        result = handle_message(user_text, agent_id=agent_id)
-        console.print(f"[bold blue]Assistant:[/bold blue] {result.get('reply', '')}")
+        # Print the reply as it streams in
+        console.print("[bold blue]Assistant:[/bold blue] ", end="")
+        for chunk in handle_message_stream(user_text, agent_id=agent_id):
+            console.print(chunk, end="", markup=False, highlight=False)
+        console.print()
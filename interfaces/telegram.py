@@ -1,28 +1,127 @@
-import os
 import asyncio
+import atexit
 import logging
-from pathlib import Path
-from dotenv import load_dotenv
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import orjson
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from core.assistant import handle_message
+from telegram.constants import ChatAction
+from telegram.error import RetryAfter
+from telegram.ext import Application, CommandHandler, MessageHandler, TypeHandler, filters, ContextTypes
+from core.assistant import handle_message_async, start_warmup
+from core.batcher import MessageBatcher
+from core.config import PROJECT_ROOT, Config
 
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
-ENV_PATH = PROJECT_ROOT / ".env"
+# Highest update_id up to which every update has been fully handled, so a
+# restart doesn't replay them; in-flight updates are redelivered instead
+OFFSET_PATH = PROJECT_ROOT / ".state" / "telegram-offset.json"
+
+# Handlers are attached in run_telegram_bot, so importing this module has no logging side effects
+logger = logging.getLogger(__name__)
+
+# Dedicated threads for blocking assistant/OpenAI calls, kept apart from the
+# event loop's default executor that the bot library also uses
+_OPENAI_POOL = ThreadPoolExecutor(max_workers=Config.load().openai_pool, thread_name_prefix="openai")
+atexit.register(_OPENAI_POOL.shutdown, wait=False)
+
+
+async def _handle_batch(key, text: str):
+    agent_id, _chat_id, _user_id = key
+    # API calls are awaited on the bot's loop; remaining blocking work runs in the OpenAI pool.
+    # On timeout the awaited API call is cancelled; a pool thread already running finishes on its own.
+    return await asyncio.wait_for(
+        handle_message_async(text, agent_id, executor=_OPENAI_POOL),
+        timeout=Config.load().openai_timeout,
+    )
 
-def _load_env():
-    """Load environment variables from .env file if present."""
-    if ENV_PATH.exists():
-        load_dotenv(dotenv_path=ENV_PATH, override=True)
-    else:
-        load_dotenv(override=True)
 
-# Enable logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+# Messages a user sends in quick succession are answered with one assistant turn
+_BATCHER = MessageBatcher(
+    _handle_batch,
+    window=Config.load().batch_ms / 1000,
+    max_items=Config.load().batch_max,
 )
-logger = logging.getLogger(__name__)
+
+# Replies faster than this go out without a "typing..." chat action first
+_TYPING_DELAY = 0.5
+
+# Handler filters are built once here; compose new ones at module scope the same way
+TEXT_NON_COMMAND = filters.TEXT & ~filters.COMMAND
+
+
+def _safe_parse(raw: bytes) -> dict:
+    # State files may be truncated or hand-edited; anything that isn't a JSON object counts as empty
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _load_offset() -> Optional[int]:
+    try:
+        raw = OFFSET_PATH.read_bytes()
+    except OSError:
+        return None
+    update_id = _safe_parse(raw).get("update_id")
+    # bool is an int subclass; reject it along with negatives and other types
+    if type(update_id) is not int or update_id < 0:
+        return None
+    return update_id
+
+
+def _save_offset(update_id: int) -> None:
+    try:
+        OFFSET_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = OFFSET_PATH.with_suffix(".tmp")
+        tmp_path.write_bytes(orjson.dumps({"update_id": update_id}))
+        os.replace(tmp_path, OFFSET_PATH)
+    except OSError as e:
+        logger.warning(f"Could not persist Telegram offset: {e}")
+
+
+# A single writer keeps offset writes off the event loop and in order
+_OFFSET_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="telegram-offset")
+atexit.register(_OFFSET_WRITER.shutdown, wait=True)
+
+_pending_updates = set()
+_last_handled = 0
+_last_offset = 0
+
+
+async def track_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Mark an update as in flight (runs before the regular handlers)."""
+    _pending_updates.add(update.update_id)
+
+
+async def record_offset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Advance the stored offset once an update is handled (runs after the regular handlers)."""
+    global _last_handled, _last_offset
+    _pending_updates.discard(update.update_id)
+    _last_handled = max(_last_handled, update.update_id)
+    # Updates are processed concurrently: never move past one that is still in flight
+    offset = _last_handled
+    if _pending_updates:
+        offset = min(offset, min(_pending_updates) - 1)
+    if offset <= _last_offset:
+        return
+    _last_offset = offset
+    await asyncio.get_running_loop().run_in_executor(_OFFSET_WRITER, _save_offset, offset)
+
+
+async def confirm_stored_offset(application: Application) -> None:
+    """Acknowledge updates handled before the last shutdown so they aren't delivered again."""
+    offset = _load_offset()
+    if offset is not None:
+        await application.bot.get_updates(offset=offset + 1, limit=1, timeout=0)
+
+
+async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if isinstance(context.error, RetryAfter):
+        logger.warning(f"Telegram rate limit hit; retrying after {context.error.retry_after}s")
+    else:
+        logger.error("Unhandled error in Telegram handler", exc_info=context.error)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -51,20 +150,26 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("Please send me a message with some text.")
         return
     
-    # Use main assistant agent (since you're the only user)
+    # Use the configured agent (main_assistant unless AGENT_ID is set)
     # For future multi-agent support, you could route based on command or context
-    agent_id = "main_assistant"
-    
-    # Show typing indicator
-    await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
+    agent_id = Config.load().agent_id
     
     try:
         # Process the message using the assistant with agent-specific memory.
-        # Run in a thread executor so we don't block the event loop or mix sync/async calls.
-        loop = asyncio.get_running_loop()
-        result = await loop.run_in_executor(
-            None, handle_message, user_text, agent_id
-        )
+        # Batches are keyed per chat and sender, so separate conversations (and
+        # different members of a group chat) never share a prompt.
+        sender = update.effective_user.id if update.effective_user else None
+        batch_key = (agent_id, update.effective_chat.id, sender)
+        task = asyncio.create_task(_BATCHER.submit(batch_key, user_text))
+        
+        # Show typing indicator only if the reply isn't back almost immediately
+        done, _ = await asyncio.wait({task}, timeout=_TYPING_DELAY)
+        if not done:
+            await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+        result = await task
+        if result is None:
+            # Folded into a later message from this chat, which carries the reply
+            return
         reply = result.get('reply', '')
         
         if not reply:
@@ -78,6 +183,10 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         if intent in ['task', 'note']:
             logger.info(f"Processed {intent} from user {update.effective_user.id}")
     
+    except asyncio.TimeoutError:
+        logger.warning(f"Timed out processing message from user {update.effective_user.id}")
+        await update.message.reply_text("Sorry, that took too long. Please try again.")
+    
     except Exception as e:
         logger.error(f"Error processing message: {e}", exc_info=True)
         await update.message.reply_text(
@@ -85,13 +194,18 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
 
 
-def run_telegram_bot():
-    """Start the Telegram bot."""
-    # Load environment variables from .env file
-    _load_env()
+_APP: Optional[Application] = None
+
+
+def _get_application() -> Application:
+    """Build the Application and register its handlers once per process."""
+    global _APP
+    if _APP is not None:
+        return _APP
     
-    # Get bot token from environment
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
+    # Get bot token from environment (Config loads the .env file)
+    config = Config.load()
+    bot_token = config.bot_token
     if not bot_token:
         raise ValueError(
             "TELEGRAM_BOT_TOKEN is not set. "
@@ -99,13 +213,68 @@ def run_telegram_bot():
         )
     
     # Create the Application
-    application = Application.builder().token(bot_token).build()
+    # Each update runs as its own task, so one slow reply doesn't hold up other chats
+    builder = Application.builder().token(bot_token).concurrent_updates(True)
+    if not config.webhook_url:
+        builder = builder.post_init(confirm_stored_offset)
+    application = builder.build()
+    
+    # Only allowlisted users reach the handlers (when an allowlist is configured)
+    allowed = config.allowed_user_ids
+    allowed_filter = filters.User(user_id=allowed) if allowed else filters.ALL
     
     # Register handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_user_message))
+    if not config.webhook_url:
+        application.add_handler(TypeHandler(Update, track_update), group=-1)
+        application.add_handler(TypeHandler(Update, record_offset), group=1)
+    application.add_handler(CommandHandler("start", start, filters=allowed_filter))
+    application.add_handler(CommandHandler("help", help_command, filters=allowed_filter))
+    application.add_handler(
+        MessageHandler(TEXT_NON_COMMAND & allowed_filter, handle_user_message)
+    )
+    application.add_error_handler(on_error)
+    
+    _APP = application
+    return _APP
+
+
+def run_telegram_bot():
+    """Start the Telegram bot."""
+    # Enable logging
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    config = Config.load()
+    application = _get_application()
+    start_warmup()
+    
+    # libuv's event loop is faster than the stdlib one when available (not on Windows)
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     
-    # Start the bot
+    if config.webhook_url:
+        # Production: Telegram pushes updates to us, so there is no idle getUpdates traffic
+        logger.info("Starting Telegram bot (webhook)...")
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=config.webhook_port,
+            url_path=config.bot_token,
+            webhook_url=f"{config.webhook_url.rstrip('/')}/{config.bot_token}",
+            secret_token=config.webhook_secret,
+            bootstrap_retries=-1,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        return
+    
+    # Development: long polling keeps one getUpdates open instead of polling repeatedly
     logger.info("Starting Telegram bot...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.run_polling(
+        poll_interval=0.0,
+        timeout=30,
+        bootstrap_retries=-1,
+        allowed_updates=Update.ALL_TYPES,
+    )
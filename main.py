@@ -1,22 +1,34 @@
-import argparse
+import sys
+
+_COMMANDS = {
+    "cli": "Run the interactive CLI assistant",
+    "telegram": "Run Telegram bot mode",
+}
+
+def _print_help(file=None):
+    # argparse is only needed to render help, so it's imported here rather than on every run
+    import argparse
 
-def main():
     parser = argparse.ArgumentParser(prog="mini-me-assistant")
     sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in _COMMANDS.items():
+        sub.add_parser(name, help=help_text)
+    parser.print_help(file)
 
-    sub.add_parser("cli", help="Run the interactive CLI assistant")
-    sub.add_parser("telegram", help="Run Telegram bot mode")
-
-    args = parser.parse_args()
+def main():
+    cmd = sys.argv[1] if len(sys.argv) > 1 else None
 
-    if args.command == "cli":
+    if cmd == "cli":
         from interfaces.cli import run_cli
         run_cli()
-    elif args.command == "telegram":
+    elif cmd == "telegram":
         from interfaces.telegram import run_telegram_bot
         run_telegram_bot()
+    elif cmd in ("-h", "--help"):
+        _print_help()
     else:
-        raise SystemExit(f"Unknown command: {args.command}")
+        _print_help(sys.stderr)
+        raise SystemExit(f"Unknown command: {cmd}" if cmd else "A command is required")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from core.batcher import MessageBatcher
+
+
+class MessageBatcherTest(unittest.TestCase):
+    def test_coalesces_per_key(self):
+        calls = []
+
+        async def handler(key, text):
+            calls.append((key, text))
+            return f"{key}:{text}"
+
+        async def run():
+            batcher = MessageBatcher(handler, window=0.05)
+            return await asyncio.gather(
+                batcher.submit("a", "one"),
+                batcher.submit("b", "other"),
+                batcher.submit("a", "two"),
+            )
+
+        results = asyncio.run(run())
+        # Folded messages resolve to None; the last of each batch gets the reply
+        self.assertEqual(results, [None, "b:other", "a:one\ntwo"])
+        self.assertCountEqual(calls, [("a", "one\ntwo"), ("b", "other")])
+
+    def test_max_items_splits_batches(self):
+        calls = []
+
+        async def handler(key, text):
+            calls.append(text)
+            return text
+
+        async def run():
+            batcher = MessageBatcher(handler, window=0.05, max_items=2)
+            return await asyncio.gather(*(batcher.submit("a", str(i)) for i in range(3)))
+
+        self.assertEqual(asyncio.run(run()), [None, "0\n1", "2"])
+        self.assertEqual(calls, ["0\n1", "2"])
+
+    def test_exception_goes_to_last_future(self):
+        async def handler(key, text):
+            raise ValueError(text)
+
+        async def run():
+            batcher = MessageBatcher(handler, window=0.05)
+            return await asyncio.gather(
+                batcher.submit("a", "one"),
+                batcher.submit("a", "two"),
+                return_exceptions=True,
+            )
+
+        first, last = asyncio.run(run())
+        self.assertIsNone(first)
+        self.assertIsInstance(last, ValueError)
+        self.assertEqual(str(last), "one\ntwo")
+
+    def test_key_is_released_after_drain(self):
+        async def handler(key, text):
+            return text
+
+        async def run():
+            batcher = MessageBatcher(handler, window=0.01)
+            await batcher.submit("a", "one")
+            self.assertEqual(batcher._queues, {})
+            # A later message starts a fresh batch
+            return await batcher.submit("a", "two")
+
+        self.assertEqual(asyncio.run(run()), "two")
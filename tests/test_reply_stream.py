@@ -0,0 +1,34 @@
+import unittest
+
+from core.assistant import _ReplyStreamExtractor
+
+
+def _stream(raw: str, size: int) -> str:
+    extractor = _ReplyStreamExtractor()
+    return "".join(extractor.feed(raw[i:i + size]) for i in range(0, len(raw), size))
+
+
+class ReplyStreamExtractorTest(unittest.TestCase):
+    def test_escapes(self):
+        raw = '{"intent": "question", "reply": "a \\"quoted\\"\\nline \\u00e9", "task": null}'
+        for size in (1, 3, len(raw)):
+            self.assertEqual(_stream(raw, size), 'a "quoted"\nline é')
+
+    def test_surrogate_pair_decodes_to_one_character(self):
+        raw = '{"intent": "question", "reply": "hi \\ud83d\\ude00 there"}'
+        for size in range(1, 14):
+            text = _stream(raw, size)
+            self.assertEqual(text, "hi \U0001F600 there")
+            text.encode("utf-8")
+
+    def test_lone_surrogates_are_replaced(self):
+        raw = '{"intent": "question", "reply": "a\\ud83d b\\ude00"}'
+        self.assertEqual(_stream(raw, 1), "a� b�")
+
+    def test_email_intent_is_not_streamed(self):
+        raw = '{"intent": "email", "reply": "hidden"}'
+        self.assertEqual(_stream(raw, 4), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from interfaces import telegram
+
+
+def _update(update_id):
+    return SimpleNamespace(update_id=update_id)
+
+
+class RecordOffsetTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patches = [
+            mock.patch.object(telegram, "OFFSET_PATH", Path(tmp.name) / "telegram-offset.json"),
+            mock.patch.object(telegram, "_pending_updates", set()),
+            mock.patch.object(telegram, "_last_handled", 0),
+            mock.patch.object(telegram, "_last_offset", 0),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_never_moves_past_in_flight_update(self):
+        async def run():
+            for update_id in (5, 6, 7):
+                await telegram.track_update(_update(update_id), None)
+
+            # 6 finishes while 5 is still in flight
+            await telegram.record_offset(_update(6), None)
+            self.assertEqual(telegram._load_offset(), 4)
+
+            await telegram.record_offset(_update(5), None)
+            self.assertEqual(telegram._load_offset(), 6)
+
+            await telegram.record_offset(_update(7), None)
+            self.assertEqual(telegram._load_offset(), 7)
+
+        asyncio.run(run())
+
+    def test_offset_stops_below_oldest_pending(self):
+        async def run():
+            for update_id in (3, 4, 5):
+                await telegram.track_update(_update(update_id), None)
+            await telegram.record_offset(_update(3), None)
+            await telegram.record_offset(_update(5), None)
+            self.assertEqual(telegram._load_offset(), 3)
+
+        asyncio.run(run())